@@ -3,14 +3,8 @@ Merger Book MVP - Main Streamlit Application
 """
 
 import streamlit as st
-import sys
-import os
 
-# Add utils directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
-
-from utils.config import Config
-from utils.database import DatabaseManager
+from utils.bootstrap import get_db, get_config_status, init_session_defaults, DOCUMENT_STATUS_ICONS
 
 # Configure Streamlit page
 st.set_page_config(
@@ -20,64 +14,72 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager(Config.DATABASE_PATH)
-
 # Set default user for testing (no authentication)
-if 'user_id' not in st.session_state:
-    st.session_state.user_id = 1  # Default test user
-if 'username' not in st.session_state:
-    st.session_state.username = "test_user"
+init_session_defaults()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _user_dashboard_stats(user_id: int):
+    """Load per-user dashboard data, cached across reruns"""
+    db = get_db()
+    recent_documents = db.get_documents_by_user(user_id, limit=5)
+    document_count = db.get_document_count(user_id)
+    companies = db.get_companies_by_user(user_id)
+    user_companies = [c for c in companies if c['data_source'] == 'user_upload']
+    total_matches = db.get_match_count_for_user(user_id)
+    return recent_documents, document_count, companies, user_companies, total_matches
 
 def main():
     """Main application entry point"""
     
-    # Sidebar navigation
+    # Sidebar navigation (fragments cannot call st.sidebar themselves)
     with st.sidebar:
-        st.title("🤝 Merger Book")
-        st.markdown("---")
-        
-        # User status (authentication disabled for testing)
-        st.success(f"Welcome, {st.session_state.username}!")
-        st.info("🔓 Authentication disabled for testing")
-        
-        st.markdown("---")
-        
-        # Configuration status
-        config_status = Config.validate_config()
-        if config_status['valid']:
-            st.success("✅ Configuration Valid")
-        else:
-            st.error("❌ Configuration Issues")
-            for issue in config_status['issues']:
-                st.error(f"• {issue}")
+        render_sidebar()
     
     # Main content area - always show dashboard
     show_dashboard()
 
+@st.fragment
+def render_sidebar():
+    """Render sidebar user and configuration status"""
+    st.title("🤝 Merger Book")
+    st.markdown("---")
+    
+    # User status (authentication disabled for testing)
+    st.success(f"Welcome, {st.session_state.username}!")
+    st.info("🔓 Authentication disabled for testing")
+    
+    st.markdown("---")
+    
+    # Configuration status
+    config_status = get_config_status()
+    if config_status['valid']:
+        st.success("✅ Configuration Valid")
+    else:
+        st.error("❌ Configuration Issues")
+        for issue in config_status['issues']:
+            st.error(f"• {issue}")
+    
+    st.button("🔄 Reload Config", on_click=get_config_status.clear)
+
 def show_dashboard():
     """Display main dashboard"""
     st.title("Merger Book Dashboard")
     
+    if st.button("🔄 Refresh"):
+        _user_dashboard_stats.clear()
+    
+    recent_documents, document_count, companies, user_companies, total_matches = _user_dashboard_stats(st.session_state.user_id)
+    
     # Quick stats
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        documents = st.session_state.db.get_documents_by_user(st.session_state.user_id)
-        st.metric("Documents Uploaded", len(documents))
+        st.metric("Documents Uploaded", document_count)
     
     with col2:
-        companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-        user_companies = [c for c in companies if c['data_source'] == 'user_upload']
         st.metric("Your Companies", len(user_companies))
     
     with col3:
-        # Count total matches for user companies
-        total_matches = 0
-        for company in user_companies:
-            matches = st.session_state.db.get_matches_by_company(company['company_id'])
-            total_matches += len(matches)
         st.metric("Total Matches", total_matches)
     
     with col4:
@@ -88,16 +90,11 @@ def show_dashboard():
     # Recent activity
     st.subheader("Recent Activity")
     
-    if documents:
+    if recent_documents:
         st.write("**Recent Documents:**")
-        for doc in documents[:5]:  # Show last 5 documents
-            status_icon = {
-                'uploaded': '📄',
-                'processing': '⏳',
-                'completed': '✅',
-                'error': '❌'
-            }.get(doc['processing_status'], '📄')
-            
+        for doc in recent_documents:  # Last 5 documents
+            status_icon = DOCUMENT_STATUS_ICONS.get(doc['processing_status'], '📄')
+
             st.write(f"{status_icon} {doc['filename']} - {doc['processing_status']}")
     else:
         st.info("No documents uploaded yet. Visit the Upload page to get started!")
@@ -4,18 +4,19 @@ Handles file upload, processing, and business feature extraction
 """
 
 import streamlit as st
-import sys
+import pandas as pd
 import os
 import time
-from typing import Dict, Any
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
 
-# Add utils directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from utils.config import Config
-from utils.database import DatabaseManager
-from utils.document_processor import DocumentProcessor
-from utils.ai_analyzer import AIAnalyzer
+from utils.bootstrap import (
+    Config, get_db, fetch_companies, get_config_status, get_doc_processor, get_ai_analyzer, get_job_executor,
+    init_session_defaults, DOCUMENT_STATUS_ICONS
+)
+from utils.notices import collect_notices, render_notices
 
 # Page configuration
 st.set_page_config(
@@ -24,31 +25,63 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager(Config.DATABASE_PATH)
+# Number of recent uploads rendered per page
+UPLOADS_PAGE_SIZE = 5
+
+# Age after which disk-cached extraction results are recomputed; persist="disk" ignores
+# st.cache_data's ttl, so the current age bucket is passed as part of the cache key
+EXTRACTION_CACHE_TTL = 7 * 24 * 60 * 60
+
+def extraction_cache_epoch() -> int:
+    """Current extraction cache age bucket"""
+    return int(time.time() // EXTRACTION_CACHE_TTL)
+
+@st.cache_data(persist="disk", show_spinner=False)
+def extract_document_content(file_hash: str, file_type: str, cache_epoch: int, _file_path: str) -> Dict[str, Any]:
+    """Extract document content, cached on disk by file content hash"""
+    extraction_result = get_doc_processor().process_document(_file_path, file_type)
+    if extraction_result['processing_status'] == 'error':
+        # Raise rather than return so failed extractions are not cached
+        raise RuntimeError(extraction_result['error_message'])
+    return extraction_result
 
-if 'doc_processor' not in st.session_state:
-    st.session_state.doc_processor = DocumentProcessor()
+class EmptyBusinessFeatures(Exception):
+    """Raised out of the feature cache to hand back an empty result without caching it"""
+    
+    def __init__(self, business_features: Dict[str, Any]):
+        super().__init__("No business features could be extracted from the document")
+        self.business_features = business_features
+
+@st.cache_data(persist="disk", show_spinner=False)
+def extract_business_features(file_hash: str, cache_epoch: int, _text_content: str, _metadata: Dict) -> Dict[str, Any]:
+    """Extract AI business features, cached on disk by file content hash"""
+    business_features = get_ai_analyzer().extract_business_features(_text_content, _metadata)
+    if not any(business_features.values()):
+        # The analyzer falls back to empty features on API errors; don't cache those
+        raise EmptyBusinessFeatures(business_features)
+    return business_features
 
-if 'ai_analyzer' not in st.session_state:
-    st.session_state.ai_analyzer = AIAnalyzer()
+def get_file_info(uploaded_file) -> Dict[str, Any]:
+    """Get information about uploaded file without loading the parsers"""
+    return {
+        'filename': uploaded_file.name,
+        'file_type': os.path.splitext(uploaded_file.name)[1].lstrip('.').lower(),
+        'file_size': uploaded_file.size,
+        'mime_type': uploaded_file.type
+    }
 
 def main():
     """Main upload page function"""
     
     # Set default user for testing (no authentication)
-    if 'user_id' not in st.session_state:
-        st.session_state.user_id = 1  # Default test user
-    if 'username' not in st.session_state:
-        st.session_state.username = "test_user"
+    init_session_defaults()
     
     st.title("📤 Upload Business Documents")
     st.markdown("Upload your business plan, annual report, or pitch deck to extract key business information and find potential merger partners.")
     st.info("🔓 Authentication disabled for testing")
     
     # Configuration check
-    config_status = Config.validate_config()
+    config_status = get_config_status()
     if not config_status['valid']:
         st.error("⚠️ Configuration issues detected:")
         for issue in config_status['issues']:
@@ -66,7 +99,7 @@ def main():
     
     if uploaded_file is not None:
         # Display file information
-        file_info = st.session_state.doc_processor.get_file_info(uploaded_file)
+        file_info = get_file_info(uploaded_file)
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -80,30 +113,24 @@ def main():
         if st.button("🚀 Process Document", type="primary", use_container_width=True):
             process_document(uploaded_file, file_info)
     
+    # Background processing status and the latest finished result
+    display_active_jobs()
+    display_finished_job()
+    
     # Display recent uploads
     st.markdown("---")
     display_recent_uploads()
 
 def process_document(uploaded_file, file_info: Dict[str, Any]):
-    """Process uploaded document"""
+    """Save uploaded document and start processing it in the background"""
     
     try:
-        # Create progress indicators
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Step 1: Save file
-        status_text.text("💾 Saving file...")
-        progress_bar.progress(10)
-        
-        file_path = st.session_state.doc_processor.save_uploaded_file(
+        # Save file
+        file_path = get_doc_processor().save_uploaded_file(
             uploaded_file, Config.UPLOAD_FOLDER
         )
         
-        # Step 2: Create database record
-        status_text.text("📝 Creating database record...")
-        progress_bar.progress(20)
-        
+        # Create database record
         document_data = {
             'user_id': st.session_state.user_id,
             'filename': file_info['filename'],
@@ -112,93 +139,176 @@ def process_document(uploaded_file, file_info: Dict[str, Any]):
             'file_size': file_info['file_size']
         }
         
-        document_id = st.session_state.db.create_document(document_data)
-        
-        # Step 3: Process document content
-        status_text.text("📄 Extracting document content...")
-        progress_bar.progress(40)
-        
-        # Update status to processing
-        st.session_state.db.update_document_processing(document_id, 'processing')
+        document_id = get_db().create_document(document_data)
+        get_db().update_document_processing(document_id, 'processing')
         
-        # Extract content
-        extraction_result = st.session_state.doc_processor.process_document(
-            file_path, file_info['file_type']
+        # Hand off extraction and AI analysis to the worker pool
+        file_hash = hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+        future = get_job_executor().submit(
+            run_processing_job, document_id, file_path, file_info, file_hash, st.session_state.user_id
         )
+        st.session_state.setdefault('active_jobs', {})[document_id] = {
+            'filename': file_info['filename'],
+            'future': future
+        }
         
-        if extraction_result['processing_status'] == 'error':
-            st.session_state.db.update_document_processing(
-                document_id, 'error', error_message=extraction_result['error_message']
+    except Exception as e:
+        st.error(f"Error processing document: {str(e)}")
+        if 'document_id' in locals():
+            get_db().update_document_processing(
+                document_id, 'error', error_message=str(e)
             )
-            st.error(f"Document processing failed: {extraction_result['error_message']}")
-            return
-        
-        # Step 4: AI analysis
-        status_text.text("🤖 Analyzing business features with AI...")
-        progress_bar.progress(60)
-        
-        business_features = st.session_state.ai_analyzer.extract_business_features(
-            extraction_result['text_content'],
-            extraction_result.get('metadata', {})
-        )
+
+class ProcessingJobError(Exception):
+    """A failed processing job, carrying the notices raised before it failed"""
+    
+    def __init__(self, message: str, notices: List[Tuple[str, str]]):
+        super().__init__(message)
+        self.notices = notices
+
+def run_processing_job(document_id: int, file_path: str, file_info: Dict[str, Any],
+                       file_hash: str, user_id: int) -> Dict[str, Any]:
+    """
+    Extract and analyze a saved document on a worker thread
+    
+    Progress is reported through the document's processing_status column,
+    so this must not touch st.session_state. Warnings and errors raised by
+    the processors are collected for the script thread to render.
+    
+    Returns:
+        Dictionary with the extraction result, business features and notices
+    """
+    with collect_notices() as notices:
+        try:
+            result = process_saved_document(document_id, file_path, file_info, file_hash, user_id)
+        except Exception as e:
+            raise ProcessingJobError(str(e), notices) from e
+    result['notices'] = notices
+    return result
+
+def process_saved_document(document_id: int, file_path: str, file_info: Dict[str, Any],
+                           file_hash: str, user_id: int) -> Dict[str, Any]:
+    """Extract, analyze and store a saved document, recording failures on its row"""
+    db = get_db()
+    ai_analyzer = get_ai_analyzer()
+    
+    try:
+        # Extract content (identical files are served from the disk cache)
+        cache_epoch = extraction_cache_epoch()
+        extraction_result = extract_document_content(file_hash, file_info['file_type'], cache_epoch, file_path)
+        extraction_result['file_path'] = file_path
         
-        # Step 5: Update database with results
-        status_text.text("💾 Saving analysis results...")
-        progress_bar.progress(80)
+        # AI analysis; an empty result is still stored, just not cached, so a re-upload retries it
+        try:
+            business_features = extract_business_features(
+                file_hash,
+                cache_epoch,
+                extraction_result['text_content'],
+                extraction_result.get('metadata', {})
+            )
+        except EmptyBusinessFeatures as e:
+            business_features = e.business_features
         
-        st.session_state.db.update_document_processing(
+        # Update database with results
+        db.update_document_processing(
             document_id, 'completed',
             extracted_content=extraction_result,
             business_features=business_features
         )
         
-        # Step 6: Create company record if business features extracted
+        # Create company record if business features extracted
         if business_features.get('company_name'):
-            status_text.text("🏢 Creating company profile...")
-            progress_bar.progress(90)
-            
-            # Generate company summary
-            company_summary = st.session_state.ai_analyzer.generate_company_summary(business_features)
+            # Generate company summary and classify industry concurrently
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # Run under copies of this context so their notices reach the job's collector
+                summary_future = executor.submit(
+                    contextvars.copy_context().run, ai_analyzer.generate_company_summary, business_features
+                )
+                industry_future = executor.submit(
+                    contextvars.copy_context().run, ai_analyzer.classify_industry, business_features
+                )
+                company_summary = summary_future.result()
+                industry = industry_future.result()
             
             company_data = {
                 'company_name': business_features.get('company_name', file_info['filename']),
-                'industry_classification': st.session_state.ai_analyzer.classify_industry(business_features),
+                'industry_classification': industry,
                 'business_description': company_summary,
-                'revenue': st.session_state.doc_processor._extract_revenue(business_features.get('revenue_info', {})),
+                'revenue': get_doc_processor()._extract_revenue(business_features.get('revenue_info', {})),
                 'employee_count': business_features.get('employee_count'),
                 'geographic_markets': ', '.join(business_features.get('geographic_markets', [])),
                 'financial_metrics': business_features.get('financial_metrics', {}),
                 'strategic_objectives': business_features.get('strategic_objectives', []),
                 'data_source': 'user_upload',
-                'user_id': st.session_state.user_id
+                'user_id': user_id
             }
             
-            company_id = st.session_state.db.create_company(company_data)
-        
-        # Complete
-        progress_bar.progress(100)
-        status_text.text("✅ Processing complete!")
+            db.create_company(company_data)
+            fetch_companies.clear()
         
-        # Display results
-        display_processing_results(extraction_result, business_features)
-        
-        # Success message with next steps
-        st.success("🎉 Document processed successfully!")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🔍 Find Merger Matches", use_container_width=True):
-                st.switch_page("pages/2_🔍_Analysis_Results.py")
-        with col2:
-            if st.button("📤 Upload Another Document", use_container_width=True):
-                st.rerun()
+        return {
+            'extraction_result': extraction_result,
+            'business_features': business_features
+        }
         
     except Exception as e:
-        st.error(f"Error processing document: {str(e)}")
-        if 'document_id' in locals():
-            st.session_state.db.update_document_processing(
-                document_id, 'error', error_message=str(e)
-            )
+        db.update_document_processing(document_id, 'error', error_message=str(e))
+        raise
+
+@st.fragment(run_every="2s")
+def display_active_jobs():
+    """Poll background processing jobs and show their status"""
+    
+    active_jobs = st.session_state.get('active_jobs', {})
+    if not active_jobs:
+        return
+    
+    finished = [document_id for document_id, job in active_jobs.items() if job['future'].done()]
+    
+    for document_id, job in active_jobs.items():
+        if document_id not in finished:
+            st.status(f"⏳ Processing {job['filename']}...", state="running")
+    
+    if finished:
+        for document_id in finished:
+            st.session_state.finished_job = active_jobs.pop(document_id)
+        # Full rerun so recent uploads and results pick up the new state
+        st.rerun()
+
+def display_finished_job():
+    """Display the most recently finished processing job"""
+    
+    job = st.session_state.get('finished_job')
+    if not job:
+        return
+    
+    error = job['future'].exception()
+    if error:
+        st.status(f"❌ Processing failed: {job['filename']}", state="error")
+        if isinstance(error, ProcessingJobError):
+            render_notices(error.notices)
+        st.error(f"Error processing document: {str(error)}")
+        return
+    
+    st.status(f"✅ Processing complete: {job['filename']}", state="complete")
+    
+    result = job['future'].result()
+    render_notices(result['notices'])
+    
+    # Display results
+    display_processing_results(result['extraction_result'], result['business_features'])
+    
+    # Success message with next steps
+    st.success("🎉 Document processed successfully!")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔍 Find Merger Matches", use_container_width=True):
+            st.switch_page("pages/2_🔍_Analysis_Results.py")
+    with col2:
+        if st.button("📤 Upload Another Document", use_container_width=True):
+            del st.session_state.finished_job
+            st.rerun()
 
 def display_processing_results(extraction_result: Dict, business_features: Dict):
     """Display document processing results"""
@@ -210,7 +320,7 @@ def display_processing_results(extraction_result: Dict, business_features: Dict)
     with col1:
         st.metric("Pages/Slides", extraction_result.get('page_count', 0))
     with col2:
-        st.metric("Words Extracted", len(extraction_result.get('text_content', '').split()))
+        st.metric("Words Extracted", extraction_result.get('word_count', 0))
     with col3:
         st.metric("Processing Status", "✅ Complete")
     
@@ -277,38 +387,58 @@ def display_processing_results(extraction_result: Dict, business_features: Dict)
             for customer in customers:
                 st.write(f"• {customer}")
 
+@st.fragment
 def display_recent_uploads():
     """Display recent document uploads"""
     
     st.subheader("📋 Recent Uploads")
     
-    documents = st.session_state.db.get_documents_by_user(st.session_state.user_id)
+    # Show documents a page at a time; "Load more" extends the list
+    visible_count = (st.session_state.get('uploads_page', 0) + 1) * UPLOADS_PAGE_SIZE
+    
+    # Fetch one extra row to know whether more documents exist
+    documents = get_db().get_documents_by_user(st.session_state.user_id, limit=visible_count + 1)
     
     if not documents:
         st.info("No documents uploaded yet. Upload your first document above!")
         return
     
-    # Display documents in a table
-    for doc in documents[:10]:  # Show last 10 documents
-        with st.expander(f"📄 {doc['filename']} - {doc['processing_status'].title()}"):
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.write(f"**Upload Date:** {doc['upload_date']}")
-                st.write(f"**File Type:** {doc['file_type'].upper()}")
-            
-            with col2:
-                st.write(f"**Status:** {doc['processing_status'].title()}")
-                if doc['file_size']:
-                    st.write(f"**Size:** {doc['file_size'] / 1024:.1f} KB")
-            
-            with col3:
-                if doc['processing_status'] == 'completed':
-                    if st.button(f"🔍 View Analysis", key=f"view_{doc['document_id']}"):
-                        st.session_state.selected_document_id = doc['document_id']
-                        st.switch_page("pages/2_🔍_Analysis_Results.py")
-                elif doc['processing_status'] == 'error':
-                    st.error(f"Error: {doc.get('error_messages', 'Unknown error')}")
+    visible_documents = documents[:visible_count]
+    
+    # Display documents in a single table
+    uploads_df = pd.DataFrame([
+        {
+            'Status': f"{DOCUMENT_STATUS_ICONS.get(doc['processing_status'], '📄')} {doc['processing_status'].title()}",
+            'Filename': doc['filename'],
+            'Upload Date': doc['upload_date'],
+            'File Type': doc['file_type'].upper(),
+            'Size (KB)': round(doc['file_size'] / 1024, 1) if doc['file_size'] else None,
+            'Error': doc.get('error_messages') if doc['processing_status'] == 'error' else None
+        }
+        for doc in visible_documents
+    ])
+    st.dataframe(uploads_df, use_container_width=True, hide_index=True)
+    
+    # Analysis link for completed documents
+    completed = {doc['document_id']: doc['filename'] for doc in visible_documents
+                 if doc['processing_status'] == 'completed'}
+    if completed:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selected_id = st.selectbox(
+                "View analysis for",
+                options=list(completed.keys()),
+                format_func=completed.get
+            )
+        with col2:
+            if st.button("🔍 View Analysis", use_container_width=True):
+                st.session_state.selected_document_id = selected_id
+                st.switch_page("pages/2_🔍_Analysis_Results.py")
+    
+    if len(documents) > visible_count:
+        if st.button("⬇️ Load more", key="load_more_uploads"):
+            st.session_state.uploads_page = st.session_state.get('uploads_page', 0) + 1
+            st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -4,20 +4,16 @@ Displays merger matches, synergy analysis, and detailed company comparisons
 """
 
 import streamlit as st
-import sys
-import os
-import plotly.express as px
-import plotly.graph_objects as go
+import html
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import Dict, List, Any
+import numpy as np
+from typing import Dict, List, Any, Tuple
 
-# Add utils directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from utils.config import Config
-from utils.database import DatabaseManager
+from utils.bootstrap import (
+    get_db, fetch_companies, get_config_status, get_ai_analyzer, get_matching_engine, get_job_executor
+)
 from utils.matching_engine import MatchingEngine
-from utils.ai_analyzer import AIAnalyzer
 
 # Page configuration
 st.set_page_config(
@@ -26,16 +22,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager(Config.DATABASE_PATH)
-
-if 'matching_engine' not in st.session_state:
-    st.session_state.matching_engine = MatchingEngine()
-
-if 'ai_analyzer' not in st.session_state:
-    st.session_state.ai_analyzer = AIAnalyzer()
-
 def main():
     """Main analysis results page function"""
     
@@ -49,8 +35,10 @@ def main():
     st.title("🔍 Merger Analysis Results")
     st.markdown("Discover potential merger partners and analyze synergy opportunities for your business.")
     
-    # Get user companies
-    user_companies = get_user_companies()
+    # Fetch companies once and partition into user and market companies
+    all_companies = fetch_companies(st.session_state.user_id)
+    user_companies = [c for c in all_companies if c['data_source'] == 'user_upload']
+    candidate_companies = [c for c in all_companies if c['data_source'] == 'market_data']
     
     if not user_companies:
         st.info("No companies found. Please upload a business document first.")
@@ -67,11 +55,59 @@ def main():
         
         # Find and display matches
         st.markdown("---")
-        display_merger_matches(selected_company)
+        display_merger_matches(selected_company, candidate_companies)
+
+# Number of bins in the match score histogram
+SCORE_HISTOGRAM_BINS = 10
+
+# Top matches whose synergy analysis is requested in the background
+SYNERGY_PREFETCH_COUNT = 3
+
+@st.cache_data(ttl=300, show_spinner=False)
+def find_matches_cached(user_company_id: int, candidate_ids: Tuple[int, ...],
+                        _matching_engine: MatchingEngine, _user_company: Dict,
+                        _candidate_companies: List[Dict]) -> List[Dict]:
+    """Find matches, cached on the user company id and candidate id set"""
+    return _matching_engine.find_matches(_user_company, _candidate_companies)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def synergy_analysis_cached(user_company_id: int, candidate_company_id: int,
+                            _user_company: Dict, _candidate_company: Dict) -> Dict:
+    """Analyze synergies with one candidate, cached on the pair of company ids"""
+    # Failed requests raise, so they are not cached and the next click retries just this pair
+    return get_ai_analyzer().request_synergy_analysis(_user_company, _candidate_company)
+
+def prefetch_synergy_job(user_company: Dict, candidates: List[Dict]):
+    """Warm the per-pair synergy cache for several candidates with concurrent LLM requests"""
+    def analyze(candidate: Dict):
+        try:
+            synergy_analysis_cached(user_company['company_id'], candidate['company_id'], user_company, candidate)
+        except Exception:
+            pass  # Retried on demand by perform_detailed_analysis
+    
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        list(executor.map(analyze, candidates))
+
+def prefetch_synergy_analyses(user_company: Dict, matches: List[Dict]):
+    """Start synergy analysis for the top matches on the job executor, once per match set"""
+    if not matches or not get_config_status()['config']['openai_configured']:
+        return
+    
+    candidates = [m['candidate_company'] for m in matches]
+    candidate_ids = tuple(c['company_id'] for c in candidates)
+    prefetch = st.session_state.get('synergy_prefetch')
+    if prefetch and prefetch['user_company_id'] == user_company['company_id'] and prefetch['candidate_ids'] == candidate_ids:
+        return
+    
+    st.session_state.synergy_prefetch = {
+        'user_company_id': user_company['company_id'],
+        'candidate_ids': candidate_ids
+    }
+    get_job_executor().submit(prefetch_synergy_job, user_company, candidates)
 
 def get_user_companies() -> List[Dict]:
     """Get companies for the current user"""
-    companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
+    companies = fetch_companies(st.session_state.user_id)
     return [c for c in companies if c['data_source'] == 'user_upload']
 
 def select_company(user_companies: List[Dict]) -> Dict:
@@ -127,29 +163,35 @@ def display_company_overview(company: Dict):
         st.write("**Business Description:**")
         st.write(company['business_description'])
 
-def display_merger_matches(user_company: Dict):
+def display_merger_matches(user_company: Dict, candidate_companies: List[Dict]):
     """Find and display potential merger matches"""
     
     st.subheader("🎯 Potential Merger Partners")
     
-    # Get all companies for matching (excluding user companies)
-    all_companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-    candidate_companies = [c for c in all_companies if c['data_source'] == 'market_data']
-    
     if not candidate_companies:
         st.warning("No market data companies available for matching. Please ensure financial data integration is working.")
         return
     
-    # Find matches
+    # Find matches (memoized on the company ids so filter changes don't recompute)
+    candidate_ids = tuple(sorted(c['company_id'] for c in candidate_companies))
     with st.spinner("🔍 Finding potential merger partners..."):
-        matches = st.session_state.matching_engine.find_matches(user_company, candidate_companies)
+        matches = find_matches_cached(
+            user_company['company_id'], candidate_ids,
+            get_matching_engine(), user_company, candidate_companies
+        )
     
     if not matches:
         st.info("No suitable merger candidates found. Try adjusting your search criteria or upload more detailed business information.")
         return
     
+    # Warm the synergy cache so Detailed Analysis on a top match returns immediately
+    prefetch_synergy_analyses(user_company, matches[:SYNERGY_PREFETCH_COUNT])
+    
+    # Parallel arrays for vectorized statistics and filtering
+    scores, types = build_match_arrays(matches)
+    
     # Display match statistics
-    display_match_statistics(matches)
+    display_match_statistics(matches, scores, types)
     
     # Display individual matches
     st.markdown("### 📋 Match Results")
@@ -167,13 +209,21 @@ def display_merger_matches(user_company: Dict):
         max_results = st.number_input("Max Results", 1, 50, 10)
     
     # Filter matches
-    filtered_matches = filter_matches(matches, min_score, match_type_filter, max_results)
+    filtered_matches = filter_matches(matches, scores, types, min_score, match_type_filter, max_results)
     
     # Display matches
-    for i, match in enumerate(filtered_matches):
-        display_match_card(match, i)
+    if filtered_matches:
+        display_match_results(user_company, filtered_matches)
+    else:
+        st.info("No matches meet the selected filters.")
 
-def display_match_statistics(matches: List[Dict]):
+def build_match_arrays(matches: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Build parallel arrays of match scores and match types"""
+    scores = np.fromiter((m['match_score'] for m in matches), dtype=float, count=len(matches))
+    types = np.array([m['match_type'] for m in matches])
+    return scores, types
+
+def display_match_statistics(matches: List[Dict], scores: np.ndarray, types: np.ndarray):
     """Display overall match statistics"""
     
     col1, col2, col3, col4 = st.columns(4)
@@ -182,93 +232,142 @@ def display_match_statistics(matches: List[Dict]):
         st.metric("Total Matches", len(matches))
     
     with col2:
-        avg_score = sum(m['match_score'] for m in matches) / len(matches) if matches else 0
+        avg_score = scores.mean() if len(scores) else 0
         st.metric("Avg Match Score", f"{avg_score:.2f}")
     
     with col3:
-        horizontal_count = sum(1 for m in matches if m['match_type'] == 'horizontal')
+        horizontal_count = int((types == 'horizontal').sum())
         st.metric("Horizontal Matches", horizontal_count)
     
     with col4:
-        vertical_count = sum(1 for m in matches if m['match_type'] == 'vertical')
+        vertical_count = int((types == 'vertical').sum())
         st.metric("Vertical Matches", vertical_count)
     
     # Match score distribution chart
     if matches:
-        scores = [m['match_score'] for m in matches]
-        fig = px.histogram(
-            x=scores,
-            nbins=10,
-            title="Match Score Distribution",
-            labels={'x': 'Match Score', 'y': 'Number of Matches'}
-        )
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
+        # Bin on the server so only ten bars reach the browser, however many matches there are
+        counts, _ = np.histogram(scores, bins=SCORE_HISTOGRAM_BINS, range=(0, 1))
+        st.plotly_chart(score_histogram(tuple(counts.tolist())), use_container_width=True)
 
-def filter_matches(matches: List[Dict], min_score: float, match_type: str, max_results: int) -> List[Dict]:
+@st.cache_data(ttl=600, show_spinner=False)
+def score_histogram(counts: Tuple[int, ...]):
+    """Build the match score distribution chart from pre-binned counts"""
+    import plotly.graph_objects as go
+    
+    edges = np.linspace(0, 1, len(counts) + 1)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=list(counts),
+        width=1 / len(counts)
+    ))
+    fig.update_layout(
+        title="Match Score Distribution",
+        xaxis_title="Match Score",
+        yaxis_title="Number of Matches",
+        bargap=0.05,
+        height=300
+    )
+    return fig
+
+def filter_matches(matches: List[Dict], scores: np.ndarray, types: np.ndarray,
+                   min_score: float, match_type: str, max_results: int) -> List[Dict]:
     """Filter matches based on criteria"""
     
-    filtered = matches
+    # Default filters keep everything, so just take the top results
+    if min_score <= 0 and match_type == "All":
+        return matches[:max_results]
     
     # Filter by score
-    filtered = [m for m in filtered if m['match_score'] >= min_score]
+    mask = scores >= min_score
     
     # Filter by type
     if match_type != "All":
-        filtered = [m for m in filtered if m['match_type'].lower() == match_type.lower()]
+        mask &= np.char.lower(types.astype(str)) == match_type.lower()
     
     # Limit results
-    return filtered[:max_results]
+    return [matches[i] for i in np.flatnonzero(mask)[:max_results]]
+
+# Match summary card, filled per match and emitted together as one HTML block
+MATCH_CARD_TEMPLATE = """
+<div style="border: 1px solid rgba(128, 128, 128, 0.35); border-radius: 0.5rem; padding: 0.75rem 1rem; margin-bottom: 0.5rem;">
+<strong>🏢 {index}. {name}</strong> &mdash; Score: {score:.2f}<br>
+<small>{details}</small>
+<p style="margin: 0.5rem 0 0 0;">{description}</p>
+</div>
+"""
+
+# Characters of business description shown on a summary card
+MATCH_CARD_DESCRIPTION_LENGTH = 280
 
-def display_match_card(match: Dict, index: int):
-    """Display individual match card"""
+def render_match_card(match: Dict, index: int) -> str:
+    """Render one match as an HTML summary card"""
+    candidate = match['candidate_company']
+    
+    details = [
+        f"Industry: {candidate.get('industry_classification') or 'N/A'}",
+        f"Match Type: {match['match_type'].title()}"
+    ]
+    if candidate.get('ticker_symbol'):
+        details.append(f"Ticker: {candidate['ticker_symbol']}")
+    if candidate.get('revenue'):
+        details.append(f"Revenue: ${candidate['revenue']:,.0f}")
+    if candidate.get('employee_count'):
+        details.append(f"Employees: {candidate['employee_count']:,}")
+    if candidate.get('geographic_markets'):
+        details.append(f"Markets: {candidate['geographic_markets']}")
+    
+    description = candidate.get('business_description') or ''
+    if len(description) > MATCH_CARD_DESCRIPTION_LENGTH:
+        description = description[:MATCH_CARD_DESCRIPTION_LENGTH].rstrip() + '…'
+    
+    return MATCH_CARD_TEMPLATE.format(
+        index=index,
+        name=escape_card_text(candidate['company_name']),
+        score=match['match_score'],
+        details=' &middot; '.join(escape_card_text(detail) for detail in details),
+        description=escape_card_text(description)
+    )
+
+def escape_card_text(text: str) -> str:
+    """Escape text for card HTML, including '$' so st.markdown doesn't read it as LaTeX"""
+    # Collapse whitespace runs, since a blank line would end markdown's HTML block mid-card
+    return ' '.join(html.escape(text).replace('$', '&#36;').split())
+
+def display_match_results(user_company: Dict, matches: List[Dict]):
+    """Display match summaries as one HTML block, with actions for a selected match"""
+    
+    st.markdown(
+        ''.join(render_match_card(match, i + 1) for i, match in enumerate(matches)),
+        unsafe_allow_html=True
+    )
     
+    selected_idx = st.selectbox(
+        "Match to explore",
+        range(len(matches)),
+        format_func=lambda i: f"{i + 1}. {matches[i]['candidate_company']['company_name']}"
+    )
+    match = matches[selected_idx]
     candidate = match['candidate_company']
     
-    with st.expander(f"🏢 {candidate['company_name']} - Score: {match['match_score']:.2f}"):
-        
-        # Basic info
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**Industry:** {candidate.get('industry_classification', 'N/A')}")
-            st.write(f"**Match Type:** {match['match_type'].title()}")
-            st.write(f"**Match Score:** {match['match_score']:.2f}")
-            
-            if candidate.get('ticker_symbol'):
-                st.write(f"**Ticker:** {candidate['ticker_symbol']}")
-        
-        with col2:
-            revenue = candidate.get('revenue', 0)
-            if revenue:
-                st.write(f"**Revenue:** ${revenue:,.0f}")
-            
-            employees = candidate.get('employee_count', 0)
-            if employees:
-                st.write(f"**Employees:** {employees:,}")
-            
-            if candidate.get('geographic_markets'):
-                st.write(f"**Markets:** {candidate['geographic_markets']}")
-        
-        # Business description
-        if candidate.get('business_description'):
-            st.write("**Business Description:**")
-            st.write(candidate['business_description'])
-        
-        # Similarity breakdown
-        if 'similarity_factors' in match:
-            display_similarity_breakdown(match['similarity_factors'])
-        
-        # Action buttons
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button(f"🔬 Detailed Analysis", key=f"analyze_{index}"):
-                perform_detailed_analysis(match)
-        
-        with col2:
-            if st.button(f"💾 Save Match", key=f"save_{index}"):
-                save_match_to_database(match)
+    # Business description
+    if candidate.get('business_description'):
+        st.write("**Business Description:**")
+        st.write(candidate['business_description'])
+    
+    # Similarity breakdown
+    if 'similarity_factors' in match:
+        display_similarity_breakdown(match['similarity_factors'])
+    
+    # Action buttons
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("🔬 Detailed Analysis", key="analyze_match"):
+            perform_detailed_analysis(user_company, match)
+    
+    with col2:
+        if st.button("💾 Save Match", key="save_match"):
+            save_match_to_database(match)
 
 def display_similarity_breakdown(similarity_factors: Dict[str, float]):
     """Display similarity factor breakdown"""
@@ -284,11 +383,21 @@ def display_similarity_breakdown(similarity_factors: Dict[str, float]):
     }
     
     # Create radar chart
+    st.plotly_chart(
+        similarity_radar(tuple(factors.values()), tuple(factors.keys())),
+        use_container_width=True
+    )
+
+@st.cache_data(ttl=600, show_spinner=False)
+def similarity_radar(values: Tuple[float, ...], labels: Tuple[str, ...]):
+    """Build the similarity breakdown radar chart"""
+    import plotly.graph_objects as go
+    
     fig = go.Figure()
     
     fig.add_trace(go.Scatterpolar(
-        r=list(factors.values()),
-        theta=list(factors.keys()),
+        r=list(values),
+        theta=list(labels),
         fill='toself',
         name='Similarity'
     ))
@@ -303,22 +412,24 @@ def display_similarity_breakdown(similarity_factors: Dict[str, float]):
         height=300
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-def perform_detailed_analysis(match: Dict):
+def perform_detailed_analysis(user_company: Dict, match: Dict):
     """Perform detailed synergy analysis"""
     
     st.subheader("🔬 Detailed Synergy Analysis")
     
+    candidate = match['candidate_company']
+    
+    # Served from the cache when the background prefetch already analyzed this match
     with st.spinner("Analyzing synergies..."):
-        # Get user company data
-        user_companies = get_user_companies()
-        user_company = user_companies[0] if user_companies else {}
-        
-        # Perform AI synergy analysis
-        synergy_analysis = st.session_state.ai_analyzer.analyze_synergies(
-            user_company, match['candidate_company']
-        )
+        try:
+            synergy_analysis = synergy_analysis_cached(
+                user_company['company_id'], candidate['company_id'], user_company, candidate
+            )
+        except Exception as e:
+            st.error(f"Error in synergy analysis: {str(e)}")
+            synergy_analysis = None
     
     if synergy_analysis:
         display_synergy_analysis(synergy_analysis)
@@ -401,7 +512,8 @@ def save_match_to_database(match: Dict):
             'confidence_score': match.get('confidence_score', match['match_score'])
         }
         
-        match_id = st.session_state.db.create_match(match_data)
+        match_id = get_db().create_match(match_data)
+        fetch_companies.clear()
         st.success(f"Match saved successfully! (ID: {match_id})")
         
     except Exception as e:
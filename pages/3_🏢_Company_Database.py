@@ -4,18 +4,11 @@ Browse and search through available companies for merger analysis
 """
 
 import streamlit as st
-import sys
-import os
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
-# Add utils directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from utils.config import Config
-from utils.database import DatabaseManager
+from utils.bootstrap import get_db, fetch_companies
+from utils.database import loads_json
 
 # Page configuration
 st.set_page_config(
@@ -24,9 +17,75 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager(Config.DATABASE_PATH)
+# Number of company cards rendered per page
+COMPANIES_PAGE_SIZE = 20
+
+# Largest industries shown individually in the distribution chart
+INDUSTRY_PIE_SLICES = 10
+
+def parse_json_field(value: Any, default: Any) -> Any:
+    """Parse a JSON column value, falling back to default when empty or malformed"""
+    if not isinstance(value, str):
+        return value if value is not None else default
+    try:
+        return loads_json(value) if value else default
+    except ValueError:
+        return default
+
+def parse_company_json(company: Dict) -> Dict:
+    """Parse a company's JSON columns in place"""
+    company['financial_metrics'] = parse_json_field(company.get('financial_metrics'), {})
+    company['strategic_objectives'] = parse_json_field(company.get('strategic_objectives'), [])
+    return company
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_company_table(user_id: int) -> Tuple[List[Dict], pd.DataFrame]:
+    """Load companies together with a DataFrame of the same rows"""
+    companies = [parse_company_json(company) for company in fetch_companies(user_id)]
+    
+    df = pd.DataFrame(companies)
+    if companies:
+        df['industry'] = df['industry_classification'].fillna('Unknown')
+    return companies, df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def industry_counts(user_id: int) -> pd.Series:
+    """Count companies per industry"""
+    _, df = load_company_table(user_id)
+    return df['industry'].value_counts()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def average_revenue(user_id: int) -> float:
+    """Mean revenue across companies that report one"""
+    _, df = load_company_table(user_id)
+    revenues = pd.to_numeric(df['revenue'], errors='coerce')
+    mean = revenues.where(revenues > 0).mean()
+    return 0.0 if pd.isna(mean) else float(mean)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def industry_options(user_id: int) -> List[str]:
+    """Sorted unique industries for the filter selectbox"""
+    return ["All"] + sorted(industry_counts(user_id).index.tolist())
+
+@st.cache_data(ttl=60, show_spinner=False)
+def industry_pie(user_id: int):
+    """Build the industry distribution pie chart"""
+    import plotly.express as px
+    
+    counts = industry_counts(user_id)
+    
+    # Fold the long tail into one slice so the chart stays readable
+    if len(counts) > INDUSTRY_PIE_SLICES:
+        top = counts.iloc[:INDUSTRY_PIE_SLICES]
+        counts = pd.concat([top, pd.Series({'Other': counts.iloc[INDUSTRY_PIE_SLICES:].sum()})])
+    
+    fig = px.pie(
+        values=counts.values,
+        names=counts.index,
+        title="Industry Distribution"
+    )
+    fig.update_layout(height=400)
+    return fig
 
 def main():
     """Main company database page function"""
@@ -42,7 +101,7 @@ def main():
     st.markdown("Browse and explore companies available for merger analysis.")
     
     # Get all companies
-    companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
+    companies, companies_df = load_company_table(st.session_state.user_id)
     
     if not companies:
         st.info("No companies in database. Upload business documents or integrate financial data to populate the database.")
@@ -50,67 +109,51 @@ def main():
             st.switch_page("pages/1_📤_Upload_Documents.py")
         return
     
-    # Separate user companies from market data
-    user_companies = [c for c in companies if c['data_source'] == 'user_upload']
-    market_companies = [c for c in companies if c['data_source'] == 'market_data']
-    
     # Display statistics
-    display_database_statistics(user_companies, market_companies)
+    display_database_statistics(companies_df)
     
     # Company browser
     st.markdown("---")
-    display_company_browser(companies)
+    display_company_browser()
 
-def display_database_statistics(user_companies: List[Dict], market_companies: List[Dict]):
+def display_database_statistics(companies_df: pd.DataFrame):
     """Display database statistics and overview"""
     
     st.subheader("📊 Database Overview")
     
+    # Column operations over the cached table rather than per-row dict lookups
+    source_counts = companies_df['data_source'].value_counts()
+    user_count = int(source_counts.get('user_upload', 0))
+    market_count = int(source_counts.get('market_data', 0))
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Your Companies", len(user_companies))
+        st.metric("Your Companies", user_count)
     
     with col2:
-        st.metric("Market Companies", len(market_companies))
+        st.metric("Market Companies", market_count)
     
     with col3:
-        st.metric("Total Companies", len(user_companies) + len(market_companies))
+        st.metric("Total Companies", user_count + market_count)
     
     with col4:
         # Calculate average revenue if available
-        all_companies = user_companies + market_companies
-        revenues = [c.get('revenue', 0) for c in all_companies if c.get('revenue', 0) > 0]
-        avg_revenue = sum(revenues) / len(revenues) if revenues else 0
+        avg_revenue = average_revenue(st.session_state.user_id)
         if avg_revenue > 0:
             st.metric("Avg Revenue", f"${avg_revenue:,.0f}")
         else:
             st.metric("Avg Revenue", "N/A")
     
     # Industry distribution chart
-    if user_companies or market_companies:
-        display_industry_distribution(user_companies + market_companies)
+    if user_count or market_count:
+        display_industry_distribution()
 
-def display_industry_distribution(companies: List[Dict]):
+def display_industry_distribution():
     """Display industry distribution chart"""
-    
-    # Count companies by industry
-    industry_counts = {}
-    for company in companies:
-        industry = company.get('industry_classification', 'Unknown')
-        industry_counts[industry] = industry_counts.get(industry, 0) + 1
-    
-    if industry_counts:
-        # Create pie chart
-        fig = px.pie(
-            values=list(industry_counts.values()),
-            names=list(industry_counts.keys()),
-            title="Industry Distribution"
-        )
-        fig.update_layout(height=400)
-        st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(industry_pie(st.session_state.user_id), use_container_width=True)
 
-def display_company_browser(companies: List[Dict]):
+def display_company_browser():
     """Display company browser with search and filters"""
     
     st.subheader("🔍 Browse Companies")
@@ -122,143 +165,117 @@ def display_company_browser(companies: List[Dict]):
         search_term = st.text_input("🔍 Search companies", placeholder="Enter company name or keyword")
     
     with col2:
-        # Get unique industries
-        industries = list(set([c.get('industry_classification', 'Unknown') for c in companies]))
-        industries.sort()
-        selected_industry = st.selectbox("Industry Filter", ["All"] + industries)
+        selected_industry = st.selectbox("Industry Filter", industry_options(st.session_state.user_id))
     
     with col3:
         data_source_filter = st.selectbox("Data Source", ["All", "Your Companies", "Market Data"])
     
-    # Apply filters
-    filtered_companies = filter_companies(companies, search_term, selected_industry, data_source_filter)
+    # Count matches first so the page selector knows its range
+    total = count_filtered_companies(
+        st.session_state.user_id, search_term, selected_industry, data_source_filter
+    )
+    page_count = max(1, (total + COMPANIES_PAGE_SIZE - 1) // COMPANIES_PAGE_SIZE)
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1) if page_count > 1 else 1
+    
+    # Fetch only the rows for the current page, already sorted by name
+    page_companies = filter_companies(
+        st.session_state.user_id, search_term, selected_industry, data_source_filter,
+        limit=COMPANIES_PAGE_SIZE, offset=(page - 1) * COMPANIES_PAGE_SIZE
+    )
     
     # Display results count
-    st.write(f"**Showing {len(filtered_companies)} companies**")
+    if page_count > 1:
+        st.write(f"**Showing {len(page_companies)} of {total} companies (page {page} of {page_count})**")
+    else:
+        st.write(f"**Showing {total} companies**")
     
     # Display companies
-    if filtered_companies:
-        display_company_grid(filtered_companies)
+    if page_companies:
+        display_company_grid(page_companies)
     else:
         st.info("No companies match your search criteria.")
 
-def filter_companies(companies: List[Dict], search_term: str, industry: str, data_source: str) -> List[Dict]:
-    """Filter companies based on search criteria"""
-    
-    filtered = companies
-    
-    # Search term filter
-    if search_term:
-        search_lower = search_term.lower()
-        filtered = [
-            c for c in filtered 
-            if (search_lower in c.get('company_name', '').lower() or
-                search_lower in c.get('business_description', '').lower() or
-                search_lower in c.get('industry_classification', '').lower())
-        ]
-    
-    # Industry filter
-    if industry != "All":
-        filtered = [c for c in filtered if c.get('industry_classification') == industry]
-    
-    # Data source filter
-    if data_source == "Your Companies":
-        filtered = [c for c in filtered if c.get('data_source') == 'user_upload']
-    elif data_source == "Market Data":
-        filtered = [c for c in filtered if c.get('data_source') == 'market_data']
-    
-    return filtered
+# Data source filter labels mapped to the stored data_source values
+DATA_SOURCE_FILTERS = {"Your Companies": 'user_upload', "Market Data": 'market_data'}
+
+def _filter_args(search_term: str, industry: str, data_source: str) -> Dict[str, Any]:
+    """Translate the browser's filter widgets into DatabaseManager filter arguments"""
+    return {
+        'data_source': DATA_SOURCE_FILTERS.get(data_source),
+        'industry': None if industry == "All" else industry,
+        'search': search_term or None,
+    }
+
+@st.cache_data(ttl=60, show_spinner=False)
+def count_filtered_companies(user_id: int, search_term: str, industry: str, data_source: str) -> int:
+    """Count companies matching the browser filters"""
+    return get_db().count_companies_filtered(user_id, **_filter_args(search_term, industry, data_source))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def filter_companies(user_id: int, search_term: str, industry: str, data_source: str,
+                     limit: int, offset: int) -> List[Dict]:
+    """Fetch one page of companies matching the browser filters, with the filtering done in SQL"""
+    companies = get_db().get_companies_filtered(
+        user_id, limit=limit, offset=offset, **_filter_args(search_term, industry, data_source)
+    )
+    return [parse_company_json(company) for company in companies]
+
+# Company fields shown in the browser table, mapped to their column headers
+COMPANY_TABLE_COLUMNS = {
+    'data_source': 'Source',
+    'company_name': 'Company',
+    'industry_classification': 'Industry',
+    'revenue': 'Revenue',
+    'employee_count': 'Employees',
+    'ticker_symbol': 'Ticker',
+    'geographic_markets': 'Markets'
+}
 
 def display_company_grid(companies: List[Dict]):
-    """Display companies in a grid layout"""
+    """Display companies as a single selectable table with actions for the selected row"""
+    
+    # Build the table column-wise instead of looking up each field per row
+    table = pd.DataFrame(companies, columns=list(COMPANY_TABLE_COLUMNS)).rename(columns=COMPANY_TABLE_COLUMNS)
+    table['Source'] = table['Source'].map({'user_upload': "👤"}).fillna("📈")
+    table['Company'] = table['Company'].fillna('Unknown Company')
+    for column in ('Revenue', 'Employees'):
+        values = pd.to_numeric(table[column], errors='coerce')
+        table[column] = values.where(values > 0)
+    
+    event = st.dataframe(
+        table,
+        column_config={
+            'Revenue': st.column_config.NumberColumn(format="$%d"),
+            'Employees': st.column_config.NumberColumn(format="%d")
+        },
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="company_table"
+    )
+    
+    selected_rows = [row for row in event.selection.rows if row < len(companies)]
+    if not selected_rows:
+        st.caption("Select a row to view details and actions.")
+        return
     
-    # Sort companies by name
-    companies.sort(key=lambda x: x.get('company_name', ''))
+    company = companies[selected_rows[0]]
     
-    # Display in grid format
-    for i in range(0, len(companies), 2):
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if i < len(companies):
-                display_company_card(companies[i])
-        
-        with col2:
-            if i + 1 < len(companies):
-                display_company_card(companies[i + 1])
-
-def display_company_card(company: Dict):
-    """Display individual company card"""
+    # Action buttons
+    col1, col2 = st.columns(2)
     
-    # Determine card color based on data source
-    if company.get('data_source') == 'user_upload':
-        border_color = "#1f77b4"  # Blue for user companies
-        source_icon = "👤"
-    else:
-        border_color = "#ff7f0e"  # Orange for market data
-        source_icon = "📈"
-    
-    with st.container():
-        # Company header
-        st.markdown(f"""
-        <div style="border-left: 4px solid {border_color}; padding-left: 10px; margin-bottom: 10px;">
-            <h4>{source_icon} {company.get('company_name', 'Unknown Company')}</h4>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Company details
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**Industry:** {company.get('industry_classification', 'N/A')}")
-            
-            revenue = company.get('revenue', 0)
-            if revenue:
-                st.write(f"**Revenue:** ${revenue:,.0f}")
-            else:
-                st.write("**Revenue:** N/A")
-        
-        with col2:
-            employees = company.get('employee_count', 0)
-            if employees:
-                st.write(f"**Employees:** {employees:,}")
-            else:
-                st.write("**Employees:** N/A")
-            
-            if company.get('ticker_symbol'):
-                st.write(f"**Ticker:** {company['ticker_symbol']}")
-        
-        # Business description
-        description = company.get('business_description', '')
-        if description:
-            # Truncate long descriptions
-            if len(description) > 150:
-                description = description[:150] + "..."
-            st.write(f"**Description:** {description}")
-        
-        # Geographic markets
-        markets = company.get('geographic_markets', '')
-        if markets:
-            st.write(f"**Markets:** {markets}")
-        
-        # Action buttons
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if st.button("👁️ View Details", key=f"view_{company['company_id']}"):
-                display_company_details(company)
-        
-        with col2:
-            if company.get('data_source') == 'market_data':
-                if st.button("🔍 Analyze Match", key=f"match_{company['company_id']}"):
-                    analyze_company_match(company)
-        
-        with col3:
-            if st.button("📊 Compare", key=f"compare_{company['company_id']}"):
-                st.session_state.selected_company_for_comparison = company
-                st.info("Company selected for comparison. Select another company to compare.")
-        
-        st.markdown("---")
+    with col1:
+        if company.get('data_source') == 'market_data':
+            if st.button("🔍 Analyze Match", key=f"match_{company['company_id']}"):
+                analyze_company_match(company)
+    
+    with col2:
+        if st.button("📊 Compare", key=f"compare_{company['company_id']}"):
+            st.session_state.selected_company_for_comparison = company
+            st.info("Company selected for comparison. Select another company to compare.")
+    
+    display_company_details(company)
 
 def display_company_details(company: Dict):
     """Display detailed company information in a modal-like expander"""
@@ -301,40 +318,24 @@ def display_company_details(company: Dict):
         
         # Financial metrics (if available)
         financial_metrics = company.get('financial_metrics')
-        if financial_metrics and financial_metrics != '{}':
+        if financial_metrics:
             st.subheader("Financial Metrics")
-            if isinstance(financial_metrics, str):
-                import json
-                try:
-                    financial_metrics = json.loads(financial_metrics)
-                except:
-                    financial_metrics = {}
-            
-            if financial_metrics:
-                for key, value in financial_metrics.items():
-                    if value:
-                        st.write(f"**{key.replace('_', ' ').title()}:** {value}")
+            for key, value in financial_metrics.items():
+                if value:
+                    st.write(f"**{key.replace('_', ' ').title()}:** {value}")
         
         # Strategic objectives (if available)
         strategic_objectives = company.get('strategic_objectives')
-        if strategic_objectives and strategic_objectives != '[]':
+        if strategic_objectives:
             st.subheader("Strategic Objectives")
-            if isinstance(strategic_objectives, str):
-                import json
-                try:
-                    strategic_objectives = json.loads(strategic_objectives)
-                except:
-                    strategic_objectives = []
-            
-            if strategic_objectives:
-                for objective in strategic_objectives:
-                    st.write(f"• {objective}")
+            for objective in strategic_objectives:
+                st.write(f"• {objective}")
 
 def analyze_company_match(company: Dict):
     """Analyze match potential with user companies"""
     
     # Get user companies
-    user_companies = [c for c in st.session_state.db.get_companies_by_user(st.session_state.user_id) 
+    user_companies = [c for c in fetch_companies(st.session_state.user_id)
                      if c['data_source'] == 'user_upload']
     
     if not user_companies:
@@ -4,18 +4,11 @@ Manages financial data integration and database population
 """
 
 import streamlit as st
-import sys
-import os
-import plotly.express as px
-import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any
 
-# Add utils directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from utils.config import Config
-from utils.database import DatabaseManager
-from utils.financial_data import FinancialDataManager
+from utils.bootstrap import get_db, fetch_companies, get_config_status, get_financial_manager
+from utils.notices import render_notices
 
 # Page configuration
 st.set_page_config(
@@ -24,12 +17,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager(Config.DATABASE_PATH)
-
-if 'financial_manager' not in st.session_state:
-    st.session_state.financial_manager = FinancialDataManager()
+# Concurrent ticker requests when updating financial data
+UPDATE_WORKERS = 10
 
 def main():
     """Main data management page function"""
@@ -45,7 +34,7 @@ def main():
     st.markdown("Manage financial data integration and database population for merger analysis.")
     
     # Configuration status
-    config_status = Config.validate_config()
+    config_status = get_config_status()
     display_configuration_status(config_status)
     
     # Database statistics
@@ -87,76 +76,90 @@ def display_configuration_status(config_status: Dict):
         with st.expander("Configuration Issues"):
             for issue in config_status['issues']:
                 st.error(f"• {issue}")
+    
+    st.button("🔄 Reload Configuration", on_click=get_config_status.clear)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def company_counts_by_industry(user_id: int) -> List[Dict]:
+    """Company counts per industry and data source"""
+    return get_db().get_company_counts_by_industry(user_id)
+
+@st.cache_data(ttl=86400, show_spinner="Fetching S&P 500 company list...")
+def sp500_listings() -> List[Dict]:
+    """S&P 500 listings used to populate market data, refreshed daily"""
+    return get_financial_manager().fetch_sp500_companies()
+
+def clear_company_caches():
+    """Drop cached company data after the companies table changes"""
+    fetch_companies.clear()
+    company_counts_by_industry.clear()
 
 def display_database_statistics():
     """Display current database statistics"""
     
     st.subheader("📊 Database Statistics")
     
-    # Get all companies
-    companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-    user_companies = [c for c in companies if c['data_source'] == 'user_upload']
-    market_companies = [c for c in companies if c['data_source'] == 'market_data']
-    
-    # Get documents
-    documents = st.session_state.db.get_documents_by_user(st.session_state.user_id)
+    # Per-industry, per-source counts aggregated in SQL, unpacked in one pass
+    # into parallel chart arrays
+    source_totals = {'user_upload': 0, 'market_data': 0}
+    industries, source_counts = [], {'user_upload': [], 'market_data': []}
+    positions = {}
+    for row in company_counts_by_industry(st.session_state.user_id):
+        industry, source, count = row['industry'], row['data_source'], row['company_count']
+        if industry not in positions:
+            positions[industry] = len(industries)
+            industries.append(industry)
+            source_counts['user_upload'].append(0)
+            source_counts['market_data'].append(0)
+        source_counts[source][positions[industry]] = count
+        source_totals[source] += count
+    
+    # Document counts per processing status
+    document_counts = get_db().get_document_status_counts(st.session_state.user_id)
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Your Companies", len(user_companies))
+        st.metric("Your Companies", source_totals['user_upload'])
     
     with col2:
-        st.metric("Market Companies", len(market_companies))
+        st.metric("Market Companies", source_totals['market_data'])
     
     with col3:
-        st.metric("Documents Processed", len(documents))
+        st.metric("Documents Processed", sum(document_counts.values()))
     
     with col4:
-        completed_docs = len([d for d in documents if d['processing_status'] == 'completed'])
-        st.metric("Successfully Processed", completed_docs)
+        st.metric("Successfully Processed", document_counts.get('completed', 0))
     
     # Industry distribution
-    if companies:
-        display_industry_distribution_chart(companies)
+    if industries:
+        display_industry_distribution_chart(
+            industries, source_counts['user_upload'], source_counts['market_data']
+        )
 
-def display_industry_distribution_chart(companies: List[Dict]):
-    """Display industry distribution chart"""
-    
-    # Count companies by industry and data source
-    industry_data = {}
-    for company in companies:
-        industry = company.get('industry_classification', 'Unknown')
-        source = company.get('data_source', 'unknown')
-        
-        if industry not in industry_data:
-            industry_data[industry] = {'user_upload': 0, 'market_data': 0}
-        
-        industry_data[industry][source] += 1
+def display_industry_distribution_chart(industries: List[str], user_counts: List[int], market_counts: List[int]):
+    """Display industry distribution chart from per-industry source counts"""
     
-    if industry_data:
-        # Prepare data for stacked bar chart
-        industries = list(industry_data.keys())
-        user_counts = [industry_data[ind]['user_upload'] for ind in industries]
-        market_counts = [industry_data[ind]['market_data'] for ind in industries]
-        
-        fig = go.Figure(data=[
-            go.Bar(name='Your Companies', x=industries, y=user_counts),
-            go.Bar(name='Market Companies', x=industries, y=market_counts)
-        ])
-        
-        fig.update_layout(
-            title="Companies by Industry",
-            barmode='stack',
-            height=400,
-            xaxis_title="Industry",
-            yaxis_title="Number of Companies"
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(data=[
+        go.Bar(name='Your Companies', x=industries, y=user_counts),
+        go.Bar(name='Market Companies', x=industries, y=market_counts)
+    ])
+    
+    fig.update_layout(
+        title="Companies by Industry",
+        barmode='stack',
+        height=400,
+        xaxis_title="Industry",
+        yaxis_title="Number of Companies"
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
 
+@st.fragment
 def display_data_management_actions():
-    """Display data management action buttons"""
+    """Display data management action buttons, rerunning on their own so the charts above are left alone"""
     
     st.subheader("🔄 Data Management Actions")
     
@@ -179,7 +182,9 @@ def display_data_management_actions():
         if st.button("🧹 Clean Up Database", use_container_width=True):
             cleanup_database()
         
+        # Clicks here only rerun this fragment, so redraw the whole page with fresh statistics
         if st.button("📊 Refresh Statistics", use_container_width=True):
+            clear_company_caches()
             st.rerun()
         
         if st.button("🔄 Update Financial Data", use_container_width=True):
@@ -192,17 +197,22 @@ def populate_market_data(max_companies: int):
     
     try:
         # Check if market companies already exist
-        companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-        market_companies = [c for c in companies if c['data_source'] == 'market_data']
+        market_count = get_db().count_companies_filtered(st.session_state.user_id, data_source='market_data')
         
-        if market_companies:
-            st.warning(f"Found {len(market_companies)} existing market companies.")
+        if market_count:
+            st.warning(f"Found {market_count} existing market companies.")
             if not st.checkbox("Continue anyway (may create duplicates)"):
                 return
         
+        # Resolve the symbol list up front so the manager fetches a fixed batch
+        listings = sp500_listings()
+        if not listings:
+            sp500_listings.clear()
+        
         # Start population process
         with st.spinner("Fetching and processing company data..."):
-            companies_added = st.session_state.financial_manager.populate_market_companies(max_companies)
+            companies_added = get_financial_manager().populate_market_companies(max_companies, listings)
+        clear_company_caches()
         
         if companies_added > 0:
             st.success(f"✅ Successfully added {companies_added} companies to the database!")
@@ -226,12 +236,12 @@ def cleanup_database():
     
     try:
         # Get statistics before cleanup
-        companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-        documents = st.session_state.db.get_documents_by_user(st.session_state.user_id)
+        company_count = get_db().count_companies_filtered(st.session_state.user_id)
+        document_count = get_db().get_document_count(st.session_state.user_id)
         
         st.write("**Current Database Status:**")
-        st.write(f"• Total Companies: {len(companies)}")
-        st.write(f"• Total Documents: {len(documents)}")
+        st.write(f"• Total Companies: {company_count}")
+        st.write(f"• Total Documents: {document_count}")
         
         # Cleanup options
         cleanup_options = st.multiselect(
@@ -247,41 +257,29 @@ def cleanup_database():
         if cleanup_options and st.button("🗑️ Perform Cleanup"):
             with st.spinner("Performing cleanup operations..."):
                 
-                if "Remove duplicate companies" in cleanup_options:
-                    # This would implement duplicate removal logic
-                    st.info("Duplicate removal not implemented in MVP")
-                
-                if "Clean up failed document processing records" in cleanup_options:
-                    # Remove documents with error status
-                    with st.session_state.db.get_connection() as conn:
-                        cursor = conn.execute("""
-                            DELETE FROM documents 
-                            WHERE processing_status = 'error' AND user_id = ?
-                        """, (st.session_state.user_id,))
-                        deleted_docs = cursor.rowcount
-                    st.success(f"Removed {deleted_docs} failed document records")
+                # Every selected operation commits together in one transaction
+                removed = get_db().cleanup_database(
+                    st.session_state.user_id,
+                    remove_duplicates="Remove duplicate companies" in cleanup_options,
+                    remove_failed_documents="Clean up failed document processing records" in cleanup_options,
+                    remove_empty_companies="Remove companies with no data" in cleanup_options,
+                    reset_matches="Reset match results" in cleanup_options
+                )
                 
-                if "Remove companies with no data" in cleanup_options:
-                    # Remove companies with minimal information
-                    with st.session_state.db.get_connection() as conn:
-                        cursor = conn.execute("""
-                            DELETE FROM companies 
-                            WHERE (revenue IS NULL OR revenue = 0) 
-                            AND (employee_count IS NULL OR employee_count = 0)
-                            AND data_source = 'market_data'
-                        """, )
-                        deleted_companies = cursor.rowcount
-                    st.success(f"Removed {deleted_companies} companies with no data")
+                results = []
+                if 'duplicate_companies' in removed:
+                    results.append(f"Removed {removed['duplicate_companies']} duplicate companies")
+                if 'failed_documents' in removed:
+                    results.append(f"Removed {removed['failed_documents']} failed document records")
+                if 'empty_companies' in removed:
+                    results.append(f"Removed {removed['empty_companies']} companies with no data")
+                if 'matches' in removed:
+                    results.append(f"Removed {removed['matches']} matches and {removed['analysis_results']} analyses")
                 
-                if "Reset match results" in cleanup_options:
-                    # Clear match results
-                    with st.session_state.db.get_connection() as conn:
-                        cursor = conn.execute("DELETE FROM matches")
-                        deleted_matches = cursor.rowcount
-                        cursor = conn.execute("DELETE FROM analysis_results")
-                        deleted_analyses = cursor.rowcount
-                    st.success(f"Removed {deleted_matches} matches and {deleted_analyses} analyses")
+                for result in results:
+                    st.success(result)
             
+            clear_company_caches()
             st.success("✅ Cleanup completed!")
     
     except Exception as e:
@@ -294,35 +292,55 @@ def update_financial_data():
     
     try:
         # Get market companies with ticker symbols
-        companies = st.session_state.db.get_companies_by_user(st.session_state.user_id)
-        market_companies = [c for c in companies if c['data_source'] == 'market_data' and c.get('ticker_symbol')]
+        ticker_count = get_db().count_companies_filtered(
+            st.session_state.user_id, data_source='market_data', with_ticker=True
+        )
         
-        if not market_companies:
+        if not ticker_count:
             st.info("No market companies with ticker symbols found to update.")
             return
         
-        st.write(f"Found {len(market_companies)} companies to update.")
+        st.write(f"Found {ticker_count} companies to update.")
         
         if st.button("🔄 Start Update Process"):
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            updated_count = 0
-            for i, company in enumerate(market_companies[:10]):  # Limit to 10 for MVP
-                symbol = company['ticker_symbol']
-                status_text.text(f"Updating {symbol}...")
-                
-                success = st.session_state.financial_manager.update_company_financials(
-                    company['company_id'], symbol
-                )
-                
-                if success:
-                    updated_count += 1
-                    st.success(f"Updated {company['company_name']}")
-                else:
-                    st.warning(f"Failed to update {company['company_name']}")
+            # Limit to 10 for MVP
+            market_companies = get_db().get_companies_filtered(
+                st.session_state.user_id, data_source='market_data', with_ticker=True, limit=10
+            )
+            
+            # Fetch tickers concurrently; each update is an I/O-bound HTTP round-trip
+            financial_manager = get_financial_manager()
+            status_text.text(f"Updating {len(market_companies)} companies...")
+            
+            updated_companies = []
+            with ThreadPoolExecutor(max_workers=UPDATE_WORKERS) as executor:
+                futures = {
+                    executor.submit(financial_manager.fetch_financials_collecting_notices, company['ticker_symbol']): company
+                    for company in market_companies
+                }
                 
-                progress_bar.progress((i + 1) / min(len(market_companies), 10))
+                # Workers have no script context, so report each result from this thread
+                for i, future in enumerate(as_completed(futures)):
+                    company = futures[future]
+                    financial_data, fetch_notices = future.result()
+                    render_notices(fetch_notices)
+                    
+                    if financial_data:
+                        updated_companies.append(financial_manager.updated_company_record(company, financial_data))
+                        st.success(f"Updated {company['company_name']}")
+                    else:
+                        st.warning(f"Failed to update {company['company_name']}")
+                    
+                    progress_bar.progress((i + 1) / len(market_companies))
+            
+            # Write every refreshed company in one transaction; market tickers upsert in place
+            if updated_companies:
+                get_db().create_companies(updated_companies)
+                clear_company_caches()
+            updated_count = len(updated_companies)
             
             status_text.text("✅ Update process complete!")
             st.success(f"Successfully updated {updated_count} companies.")
@@ -336,7 +354,12 @@ def display_market_statistics():
     st.subheader("📈 Market Statistics")
     
     try:
-        stats = st.session_state.financial_manager.get_market_statistics()
+        # One indexed probe instead of the aggregate queries when there is no market data yet
+        if not get_db().has_market_data():
+            st.info("No market statistics available. Populate market data first.")
+            return
+        
+        stats = get_financial_manager().get_market_statistics()
         
         if not stats:
             st.info("No market statistics available. Populate market data first.")
@@ -367,6 +390,7 @@ def display_market_statistics():
             st.write("**Industry Distribution:**")
             
             # Create pie chart
+            import plotly.express as px
             fig = px.pie(
                 values=list(industry_dist.values()),
                 names=list(industry_dist.keys()),
@@ -5,18 +5,66 @@ Saves results to test-data/ directory as JSON files
 """
 
 import os
+import re
 import sys
-import json
+import mmap
+import hashlib
+import operator
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 # Add utils directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 
+from utils.keyword_matcher import KeywordMatcher
+
+# Rule-based feature keywords
+INDUSTRY_KEYWORDS = {
+    'fintech': frozenset({'fintech', 'financial technology', 'lending platform'}),
+    'real estate': frozenset({'real estate', 'property', 'estate'}),
+    'lending': frozenset({'lending', 'loans', 'credit', 'financing'}),
+    'platform': frozenset({'platform', 'marketplace', 'digital platform'})
+}
+GEOGRAPHIC_KEYWORDS = ['europe', 'estonia', 'latvia', 'lithuania', 'finland', 'germany', 'spain']
+REVENUE_KEYWORDS = ['million', 'eur', '€']
+PRODUCT_KEYWORDS = {
+    'loan': 'Property-backed loans',
+    'platform': 'Digital lending platform',
+    'investment': 'Investment opportunities'
+}
+OBJECTIVE_KEYWORDS = {
+    'growth': 'Business growth and expansion',
+    'market': 'Market expansion',
+    'technology': 'Technology development'
+}
+
+# Single matcher over every keyword above
+KEYWORD_MATCHER = KeywordMatcher(
+    ['estateguru', *GEOGRAPHIC_KEYWORDS, *REVENUE_KEYWORDS, *PRODUCT_KEYWORDS, *OBJECTIVE_KEYWORDS]
+    + [keyword for keywords in INDUSTRY_KEYWORDS.values() for keyword in keywords]
+)
+
+# On-disk cache for extracted PDF text, keyed on the file's SHA-256
+CACHE_DIR = os.path.join('test-data', '.cache')
+
+# Bump when the extraction output changes to invalidate cached text
+EXTRACTOR_VERSION = 'v2'
+
+# Matches a single whitespace-delimited word
+WORD_PATTERN = re.compile(r'\S+')
+
+# Pages per PyMuPDF extraction job sent to a worker process
+PAGES_PER_JOB = 16
+
 def main():
     """Main test function"""
     
     print("🚀 Starting EstateGuru document processing test...")
     
+    # One timestamp for every record produced by this run
+    run_timestamp = datetime.now().isoformat()
+    
     # Ensure test-data directory exists
     os.makedirs('test-data', exist_ok=True)
     
@@ -30,26 +78,21 @@ def main():
     print(f"📄 Processing document: {pdf_path}")
     
     try:
-        # Step 1: Simple document extraction using PyPDF2
+        # Step 1: Simple document extraction, reusing cached text for an unchanged file
         print("📄 Extracting document content...")
         
-        from PyPDF2 import PdfReader
-        
-        reader = PdfReader(pdf_path)
-        text_content = ""
-        
-        for page_num, page in enumerate(reader.pages):
-            text_content += f"\n--- Page {page_num + 1} ---\n"
-            text_content += page.extract_text()
+        extracted = load_pdf_text(pdf_path)
+        text_content = extracted['text_content']
         
         extraction_result = {
             'processing_status': 'completed',
             'text_content': text_content,
-            'page_count': len(reader.pages),
+            'page_count': extracted['page_count'],
+            'word_count': extracted['word_count'],
             'metadata': {
                 'filename': 'EstateGuru-2024-10-01.pdf',
                 'file_type': 'pdf',
-                'processing_date': datetime.now().isoformat()
+                'processing_date': run_timestamp
             }
         }
         
@@ -62,51 +105,34 @@ def main():
         
         text_lower = text_content.lower()
         
+        # Find every keyword in one pass over the document
+        hits = KEYWORD_MATCHER.find(text_lower)
+        
         # Extract company name
         company_name = "EstateGuru"
-        if "estateguru" in text_lower:
+        if "estateguru" in hits:
             company_name = "EstateGuru"
         
         # Extract industry information
-        industry_keywords = {
-            'fintech': ['fintech', 'financial technology', 'lending platform'],
-            'real estate': ['real estate', 'property', 'estate'],
-            'lending': ['lending', 'loans', 'credit', 'financing'],
-            'platform': ['platform', 'marketplace', 'digital platform']
-        }
-        
-        detected_industries = []
-        for industry, keywords in industry_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                detected_industries.append(industry)
+        detected_industries = [
+            industry for industry, keywords in INDUSTRY_KEYWORDS.items()
+            if not hits.isdisjoint(keywords)
+        ]
         
         # Extract geographic markets
-        geographic_keywords = ['europe', 'estonia', 'latvia', 'lithuania', 'finland', 'germany', 'spain']
-        geographic_markets = [geo for geo in geographic_keywords if geo in text_lower]
+        geographic_markets = [geo for geo in GEOGRAPHIC_KEYWORDS if geo in hits]
         
         # Extract revenue information
         revenue_info = {}
-        if 'million' in text_lower or 'eur' in text_lower or '€' in text_content:
+        if 'million' in hits or 'eur' in hits or '€' in hits:
             revenue_info['currency'] = 'EUR'
             revenue_info['scale'] = 'millions'
         
         # Extract key products/services
-        key_products = []
-        if 'loan' in text_lower:
-            key_products.append('Property-backed loans')
-        if 'platform' in text_lower:
-            key_products.append('Digital lending platform')
-        if 'investment' in text_lower:
-            key_products.append('Investment opportunities')
+        key_products = [product for keyword, product in PRODUCT_KEYWORDS.items() if keyword in hits]
         
         # Extract strategic objectives
-        strategic_objectives = []
-        if 'growth' in text_lower:
-            strategic_objectives.append('Business growth and expansion')
-        if 'market' in text_lower:
-            strategic_objectives.append('Market expansion')
-        if 'technology' in text_lower:
-            strategic_objectives.append('Technology development')
+        strategic_objectives = [objective for keyword, objective in OBJECTIVE_KEYWORDS.items() if keyword in hits]
         
         business_features = {
             'company_name': company_name,
@@ -137,7 +163,7 @@ def main():
             'strategic_objectives': business_features['strategic_objectives'],
             'data_source': 'user_upload',
             'user_id': 1,
-            'processed_date': datetime.now().isoformat()
+            'processed_date': run_timestamp
         }
         
         # Save company profile
@@ -189,57 +215,54 @@ def main():
         save_json_result('sample_market_companies.json', sample_companies)
         print(f"✅ Created {len(sample_companies)} sample market companies")
         
-        # Step 5: Create matches
+        # Steps 5-6: Create matches and synergy analyses in one pass, highest score first
         matches = []
-        for company in sample_companies:
-            match = {
+        synergy_analyses = []
+        for company in sorted(sample_companies, key=operator.itemgetter('similarity_score'), reverse=True):
+            score = company['similarity_score']
+            is_lending = 'lending' in company['business_model'].lower()
+            geographic_overlap = 'Europe' in company['geographic_markets']
+            matches.append({
                 'target_company': company['company_name'],
                 'industry_match': True,
-                'geographic_overlap': 'Europe' in company['geographic_markets'],
-                'business_model_similarity': 'lending' in company['business_model'].lower(),
-                'similarity_score': company['similarity_score'],
-                'match_type': 'horizontal' if 'lending' in company['business_model'].lower() else 'vertical'
-            }
-            matches.append(match)
-        
-        # Sort by similarity score
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
+                'geographic_overlap': geographic_overlap,
+                'business_model_similarity': is_lending,
+                'similarity_score': score,
+                'match_type': 'horizontal' if is_lending else 'vertical'
+            })
+            
+            if len(synergy_analyses) < 3:  # Top 3 matches
+                synergy_analyses.append({
+                    'target_company': company['company_name'],
+                    'match_score': score,
+                    'revenue_synergies': {
+                        'cross_selling_potential': 'High' if geographic_overlap else 'Medium',
+                        'market_expansion': 'Significant' if not geographic_overlap else 'Limited',
+                        'estimated_revenue_increase': f"{int(score * 15)}%"
+                    },
+                    'cost_synergies': {
+                        'technology_consolidation': 'High',
+                        'operational_efficiency': 'Medium',
+                        'estimated_cost_savings': f"{int(score * 20)}%"
+                    },
+                    'strategic_synergies': {
+                        'market_position': 'Strengthened',
+                        'competitive_advantage': 'Enhanced',
+                        'risk_diversification': 'Improved'
+                    },
+                    'risk_factors': [
+                        'Regulatory compliance differences',
+                        'Cultural integration challenges',
+                        'Technology integration complexity'
+                    ]
+                })
         
         # Save matches
         save_json_result('estateguru_matches.json', matches)
         print(f"✅ Found {len(matches)} potential matches")
         
-        # Step 6: Create synergy analysis
         print("🔗 Analyzing synergies...")
         
-        synergy_analyses = []
-        for match in matches[:3]:  # Top 3 matches
-            synergy = {
-                'target_company': match['target_company'],
-                'match_score': match['similarity_score'],
-                'revenue_synergies': {
-                    'cross_selling_potential': 'High' if match['geographic_overlap'] else 'Medium',
-                    'market_expansion': 'Significant' if not match['geographic_overlap'] else 'Limited',
-                    'estimated_revenue_increase': f"{int(match['similarity_score'] * 15)}%"
-                },
-                'cost_synergies': {
-                    'technology_consolidation': 'High',
-                    'operational_efficiency': 'Medium',
-                    'estimated_cost_savings': f"{int(match['similarity_score'] * 20)}%"
-                },
-                'strategic_synergies': {
-                    'market_position': 'Strengthened',
-                    'competitive_advantage': 'Enhanced',
-                    'risk_diversification': 'Improved'
-                },
-                'risk_factors': [
-                    'Regulatory compliance differences',
-                    'Cultural integration challenges',
-                    'Technology integration complexity'
-                ]
-            }
-            synergy_analyses.append(synergy)
-        
         # Save synergy analyses
         save_json_result('estateguru_synergy_analysis.json', synergy_analyses)
         print(f"✅ Synergy analysis complete for top {len(synergy_analyses)} matches")
@@ -249,11 +272,11 @@ def main():
         
         summary_report = {
             'company_name': company_data['company_name'],
-            'processing_date': datetime.now().isoformat(),
+            'processing_date': run_timestamp,
             'document_info': {
                 'filename': 'EstateGuru-2024-10-01.pdf',
                 'pages': extraction_result['page_count'],
-                'words_extracted': len(extraction_result['text_content'].split())
+                'words_extracted': extraction_result['word_count']
             },
             'business_features_summary': {
                 'industry': business_features['industry_classification'],
@@ -282,9 +305,10 @@ def main():
         
         print("\n🎉 Processing complete! Results saved to test-data/")
         print("\nFiles created:")
-        for filename in sorted(os.listdir('test-data')):
-            if filename.endswith('.json'):
-                print(f"  📄 {filename}")
+        with os.scandir('test-data') as entries:
+            json_files = sorted(entry.name for entry in entries if entry.name.endswith('.json'))
+        for filename in json_files:
+            print(f"  📄 {filename}")
         
         print(f"\n📊 Summary:")
         print(f"  • Company: {summary_report['company_name']}")
@@ -299,11 +323,101 @@ def main():
         import traceback
         traceback.print_exc()
 
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's content, hashed through a read-only memory map"""
+    with open(path, 'rb') as f:
+        # mmap rejects empty files, so hash those directly
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+def load_pdf_text(pdf_path: str) -> dict:
+    """Return text_content, page_count and word_count for a PDF, cached on disk by file hash"""
+    digest = file_sha256(pdf_path)
+    cache_path = os.path.join(CACHE_DIR, f"pdftext-{digest}-{EXTRACTOR_VERSION}.json")
+    
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    extracted = extract_pdf_text(pdf_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        f.write(orjson.dumps(extracted))
+    return extracted
+
+def extract_pdf_text(pdf_path: str) -> dict:
+    """Extract page-delimited text with PyMuPDF, falling back to PyPDF2"""
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+    
+    if fitz is None:
+        from PyPDF2 import PdfReader
+        
+        parts = []
+        word_count = 0
+        # PdfReader copies a path's whole file into memory, so hand it a mapped view instead
+        with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reader = PdfReader(mm)
+            for page_num, page in enumerate(reader.pages):
+                page_text = page.extract_text() or ""
+                parts.append(f"\n--- Page {page_num + 1} ---\n")
+                parts.append(page_text)
+                word_count += count_words(page_text)
+            page_count = len(reader.pages)
+        return {'text_content': "".join(parts), 'page_count': page_count, 'word_count': word_count}
+    
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    
+    # Fan page ranges out to worker processes; each reopens the document itself
+    jobs = [
+        (pdf_path, start, min(start + PAGES_PER_JOB, page_count))
+        for start in range(0, page_count, PAGES_PER_JOB)
+    ]
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+            results = list(executor.map(extract_page_range, jobs))
+    else:
+        results = [extract_page_range(job) for job in jobs]
+    
+    return {
+        'text_content': "".join(text for text, _ in results),
+        'page_count': page_count,
+        'word_count': sum(words for _, words in results)
+    }
+
+def extract_page_range(job: tuple) -> tuple:
+    """Extract page-delimited text and its word count for pages [start, stop) with PyMuPDF"""
+    pdf_path, start, stop = job
+    import fitz
+    
+    parts = []
+    word_count = 0
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, stop):
+            page_text = doc[page_num].get_text()
+            parts.append(f"\n--- Page {page_num + 1} ---\n")
+            parts.append(page_text)
+            word_count += count_words(page_text)
+    return "".join(parts), word_count
+
+def count_words(text: str) -> int:
+    """Count whitespace-delimited words without building a list"""
+    return sum(1 for _ in WORD_PATTERN.finditer(text))
+
 def save_json_result(filename: str, data: dict):
     """Save result data as JSON file"""
     filepath = os.path.join('test-data', filename)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    with open(filepath, 'wb') as f:
+        f.write(orjson.dumps(
+            data,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            default=str
+        ))
     print(f"💾 Saved: {filename}")
 
 if __name__ == "__main__":
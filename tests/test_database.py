@@ -0,0 +1,192 @@
+"""
+Tests for DatabaseManager schema migrations and connection handling
+"""
+
+import gc
+import sqlite3
+import threading
+
+from utils.database import DatabaseManager, SCHEMA_VERSION
+
+# Schema written by the first release: no FTS index, no ticker uniqueness, user_version 0
+BASELINE_SCHEMA_SQL = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP,
+    subscription_level TEXT DEFAULT 'free',
+    preferences TEXT DEFAULT '{}',
+    is_active BOOLEAN DEFAULT 1
+);
+CREATE TABLE companies (
+    company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name TEXT NOT NULL,
+    ticker_symbol TEXT,
+    industry_classification TEXT,
+    revenue REAL,
+    employee_count INTEGER,
+    geographic_markets TEXT,
+    business_description TEXT,
+    financial_metrics TEXT DEFAULT '{}',
+    strategic_objectives TEXT DEFAULT '{}',
+    data_source TEXT NOT NULL CHECK (data_source IN ('user_upload', 'market_data')),
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+CREATE TABLE matches (
+    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_company_id INTEGER NOT NULL,
+    candidate_company_id INTEGER NOT NULL,
+    match_score REAL NOT NULL,
+    match_type TEXT NOT NULL CHECK (match_type IN ('horizontal', 'vertical')),
+    synergy_predictions TEXT DEFAULT '{}',
+    risk_assessment TEXT DEFAULT '{}',
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    analysis_version TEXT DEFAULT '1.0',
+    confidence_score REAL,
+    FOREIGN KEY (user_company_id) REFERENCES companies (company_id),
+    FOREIGN KEY (candidate_company_id) REFERENCES companies (company_id)
+);
+INSERT INTO companies (company_name, ticker_symbol, industry_classification, data_source)
+VALUES ('Apple', 'AAPL', 'Technology', 'market_data'),
+       ('Apple Inc', 'AAPL', 'Technology', 'market_data'),
+       ('Microsoft', 'MSFT', 'Technology', 'market_data');
+INSERT INTO companies (company_name, data_source) VALUES ('Mine', 'user_upload');
+INSERT INTO matches (user_company_id, candidate_company_id, match_score, match_type)
+VALUES (4, 2, 0.5, 'horizontal');
+"""
+
+def make_baseline_db(path) -> str:
+    """Write a first-release database holding a duplicated market ticker"""
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA_SQL)
+    conn.close()
+    return str(path)
+
+def test_migration_folds_duplicate_market_tickers(tmp_path):
+    db = DatabaseManager(make_baseline_db(tmp_path / 'baseline.db'))
+    try:
+        conn = db.get_connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+        tickers = [tuple(row) for row in conn.execute("""
+            SELECT company_id, ticker_symbol FROM companies
+            WHERE data_source = 'market_data' ORDER BY company_id
+        """)]
+        assert tickers == [(1, 'AAPL'), (3, 'MSFT')]
+
+        # The match on the deleted duplicate now points at the kept row
+        assert conn.execute("SELECT candidate_company_id FROM matches").fetchone()[0] == 1
+
+        # Pre-existing rows are searchable and the index matches its content table
+        conn.execute("INSERT INTO companies_fts(companies_fts) VALUES ('integrity-check')")
+        hits = [row[0] for row in conn.execute("""
+            SELECT rowid FROM companies_fts WHERE companies_fts MATCH 'apple OR microsoft' ORDER BY rowid
+        """)]
+        assert hits == [1, 3]
+    finally:
+        db.close()
+
+def test_migrated_database_reopens(tmp_path):
+    path = make_baseline_db(tmp_path / 'baseline.db')
+    DatabaseManager(path).close()
+
+    db = DatabaseManager(path)
+    try:
+        company_id = db.create_company({
+            'company_name': 'Apple Inc.', 'ticker_symbol': 'AAPL', 'data_source': 'market_data'
+        })
+        assert company_id == 1
+    finally:
+        db.close()
+
+def test_thread_connections_close_when_thread_ends(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'threads.db'))
+    try:
+        def query():
+            db.get_connection().execute("SELECT COUNT(*) FROM companies").fetchone()
+
+        for _ in range(20):
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+        del thread
+        gc.collect()
+
+        # Only the connection opened by this thread for init_database remains
+        assert len(db._connections) == 1
+    finally:
+        db.close()
+    assert not db._connections
+
+def test_market_stats_follow_market_company_writes(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'stats.db'))
+    try:
+        def technology_stats():
+            return tuple(db.get_connection().execute("""
+                SELECT company_count, revenue_total FROM market_stats_cache
+                WHERE industry_classification = 'Technology'
+            """).fetchone())
+
+        apple_id, _ = db.create_companies([
+            {'company_name': 'Apple', 'ticker_symbol': 'AAPL', 'industry_classification': 'Technology',
+             'revenue': 100.0, 'data_source': 'market_data'},
+            {'company_name': 'Microsoft', 'ticker_symbol': 'MSFT', 'industry_classification': 'Technology',
+             'data_source': 'market_data'}
+        ])
+        assert technology_stats() == (2, 100.0)
+
+        db.update_company_financials(apple_id, {'revenue': 150.0, 'employee_count': 10})
+        assert technology_stats() == (2, 150.0)
+
+        assert db.cleanup_database(1, remove_empty_companies=True) == {'empty_companies': 1}
+        assert technology_stats() == (1, 150.0)
+    finally:
+        db.close()
+
+def test_company_search_matches_substrings(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'search.db'))
+    try:
+        db.create_companies([
+            {'company_name': 'Microsoft', 'ticker_symbol': 'MSFT', 'industry_classification': 'Technology',
+             'business_description': 'Cloud software and AI', 'data_source': 'market_data'},
+            {'company_name': 'Apple', 'ticker_symbol': 'AAPL', 'industry_classification': 'Technology',
+             'business_description': 'Consumer hardware', 'data_source': 'market_data'}
+        ])
+
+        def names(search):
+            return [c['company_name'] for c in db.get_companies_filtered(1, search=search)]
+
+        assert names('soft') == ['Microsoft']
+        assert names('SOFTWARE AND') == ['Microsoft']
+        assert names('technolog') == ['Apple', 'Microsoft']
+        assert names('ai') == ['Microsoft']
+        assert names('10%') == []
+    finally:
+        db.close()
+
+def test_duplicate_cleanup_repoints_matches(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'cleanup.db'))
+    try:
+        keeper_id, duplicate_id, user_company_id = db.create_companies([
+            {'company_name': 'Acme', 'data_source': 'market_data'},
+            {'company_name': 'ACME', 'data_source': 'market_data'},
+            {'company_name': 'Mine', 'data_source': 'user_upload', 'user_id': 1}
+        ])
+        match_id = db.create_match({
+            'user_company_id': user_company_id, 'candidate_company_id': duplicate_id,
+            'match_score': 0.5, 'match_type': 'horizontal'
+        })
+        db.create_analysis_result({'match_id': match_id, 'analysis_type': 'synergy'})
+
+        assert db.cleanup_database(1, remove_duplicates=True) == {'duplicate_companies': 1}
+
+        conn = db.get_connection()
+        assert conn.execute("SELECT candidate_company_id FROM matches").fetchone()[0] == keeper_id
+        assert conn.execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0] == 1
+    finally:
+        db.close()
@@ -0,0 +1,3 @@
+"""
+Utility package for Merger Book MVP
+"""
@@ -0,0 +1,53 @@
+"""
+Process-wide shared resources for Merger Book MVP
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+import streamlit as st
+from utils.config import Config
+from utils.database import DatabaseManager
+
+@st.cache_resource
+def get_db() -> DatabaseManager:
+    """Get the database manager shared by all sessions"""
+    return DatabaseManager(Config.DATABASE_PATH)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_companies(user_id: int) -> List[Dict]:
+    """Get a user's companies plus market data, cached across reruns"""
+    return get_db().get_companies_by_user(user_id)
+
+@st.cache_resource(show_spinner=False)
+def get_config_status() -> Dict[str, Any]:
+    """Get configuration status, validated once until a reload button clears it (treat as read-only)"""
+    return Config.validate_config()
+
+@st.cache_resource
+def get_doc_processor():
+    """Load the document processor (and its parser libraries) on first use"""
+    from utils.document_processor import DocumentProcessor
+    return DocumentProcessor()
+
+@st.cache_resource
+def get_ai_analyzer():
+    """Load the AI analyzer (and its SDKs) on first use"""
+    from utils.ai_analyzer import AIAnalyzer
+    return AIAnalyzer()
+
+@st.cache_resource
+def get_matching_engine():
+    """Load the matching engine (and scikit-learn) on first use"""
+    from utils.matching_engine import MatchingEngine
+    return MatchingEngine()
+
+@st.cache_resource
+def get_financial_manager():
+    """Load the financial data manager (and its market data clients) on first use, sharing the app database"""
+    from utils.financial_data import FinancialDataManager
+    return FinancialDataManager(get_db())
+
+@st.cache_resource
+def get_job_executor() -> ThreadPoolExecutor:
+    """Get the worker pool that runs document processing off the script thread"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='document-job')
@@ -4,15 +4,105 @@ Uses OpenAI and LangChain for business feature extraction and synergy analysis
 """
 
 import os
-import json
+import time
+import hashlib
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any, Tuple
 import openai
 from langchain_community.llms import OpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import streamlit as st
 from utils.config import Config
+from utils.keyword_matcher import KeywordMatcher
+from utils import notices
+
+# orjson options for company data embedded in prompts
+PROMPT_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# List-valued features merged across document chunks
+CONSOLIDATED_LIST_KEYS = (
+    'geographic_markets', 'key_products_services', 'technology_stack',
+    'competitive_advantages', 'strategic_objectives', 'partnerships',
+    'target_customers', 'risks_challenges'
+)
+
+# Keyword rules for classify_industry, checked in this order
+INDUSTRY_KEYWORDS = {
+    'Technology': frozenset({'software', 'saas', 'platform', 'api', 'cloud', 'ai', 'machine learning'}),
+    'Financial Services': frozenset({'fintech', 'payment', 'banking', 'insurance', 'investment'}),
+    'Healthcare': frozenset({'healthcare', 'medical', 'biotech', 'pharmaceutical', 'health'}),
+    'Manufacturing': frozenset({'manufacturing', 'production', 'factory', 'industrial'}),
+    'Retail': frozenset({'retail', 'e-commerce', 'consumer', 'marketplace'}),
+    'Energy': frozenset({'energy', 'oil', 'gas', 'renewable', 'solar', 'wind'}),
+    'Real Estate': frozenset({'real estate', 'property', 'construction', 'development'}),
+    'Transportation': frozenset({'transportation', 'logistics', 'shipping', 'delivery'}),
+    'Media': frozenset({'media', 'entertainment', 'content', 'publishing', 'advertising'})
+}
+
+# Single matcher over every industry keyword
+INDUSTRY_KEYWORD_MATCHER = KeywordMatcher(
+    keyword for keywords in INDUSTRY_KEYWORDS.values() for keyword in keywords
+)
+
+# Terms that mark a chunk as worth sending for feature extraction
+BUSINESS_SIGNAL_MATCHER = KeywordMatcher([
+    'revenue', 'sales', 'profit', 'customer', 'client', 'market', 'product', 'service',
+    'business', 'company', 'industry', 'growth', 'strategy', 'employee', 'partner', 'competit'
+])
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int,
+               max_chunks: Optional[int] = None) -> List[str]:
+    """Split text into overlapping chunks, breaking at paragraph boundaries where possible"""
+    chunks = []
+    start = 0
+    while start < len(text) and (max_chunks is None or len(chunks) < max_chunks):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Prefer the last paragraph break in the back half of the window
+            boundary = text.rfind('\n\n', start + chunk_size // 2, end)
+            if boundary != -1:
+                end = boundary
+        
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        
+        if end == len(text):
+            break
+        start = max(end - chunk_overlap, start + 1)
+    
+    return chunks
+
+# Bump when prompts or response parsing change so cached completions are recomputed
+COMPLETION_PROMPT_VERSION = 1
+
+# Age after which disk-cached completions are recomputed; persist="disk" ignores
+# st.cache_data's ttl, so the current age bucket is passed as part of the cache key
+COMPLETION_CACHE_TTL = 7 * 24 * 60 * 60
+
+def completion_cache_epoch() -> int:
+    """Current completion cache age bucket"""
+    return int(time.time() // COMPLETION_CACHE_TTL)
+
+@st.cache_data(show_spinner=False, persist="disk")
+def cached_completion(model: str, cache_epoch: int, request_key: str, parse_json: bool,
+                      _client: openai.OpenAI, _request: Dict[str, Any]) -> Any:
+    """Run a chat completion, cached on disk by model, age bucket and a BLAKE2b hash of the request"""
+    response = _client.chat.completions.create(**_request)
+    content = response.choices[0].message.content
+    
+    if not parse_json:
+        return content.strip()
+    
+    # Clean up the response to extract JSON
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    
+    return orjson.loads(content.strip())
 
 class AIAnalyzer:
     """AI-powered business analysis and matching"""
@@ -23,10 +113,25 @@ class AIAnalyzer:
             base_url=Config.OPENAI_API_BASE
         )
         self.model = Config.OPENAI_MODEL
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=4000,
-            chunk_overlap=200,
-            length_function=len
+        self.chunk_size = 4000
+        self.chunk_overlap = 200
+    
+    def _complete(self, system_prompt: str, user_prompt: str, temperature: float,
+                  max_tokens: int, parse_json: bool = False) -> Any:
+        """Run a chat completion through the shared response cache"""
+        request = {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+        keyed_request = {'model': self.model, 'prompt_version': COMPLETION_PROMPT_VERSION, 'request': request}
+        request_key = hashlib.blake2b(orjson.dumps(keyed_request, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return cached_completion(
+            self.model, completion_cache_epoch(), request_key, parse_json, self.openai_client, request
         )
     
     def extract_business_features(self, document_content: str, document_metadata: Dict = None) -> Dict[str, Any]:
@@ -42,14 +147,30 @@ class AIAnalyzer:
         """
         try:
             # Split document into manageable chunks
-            chunks = self.text_splitter.split_text(document_content)
+            chunks = split_text(
+                document_content, self.chunk_size, self.chunk_overlap,
+                max_chunks=5  # Limit to first 5 chunks for MVP
+            )
             
-            # Extract features from each chunk and combine
+            # Skip chunks with no business content; the first always goes for the company name
+            chunks = [
+                chunk for index, chunk in enumerate(chunks)
+                if index == 0 or BUSINESS_SIGNAL_MATCHER.contains_any(chunk.lower())
+            ]
+            
+            # Extract features from each chunk concurrently and combine
             all_features = []
-            for chunk in chunks[:5]:  # Limit to first 5 chunks for MVP
-                features = self._extract_features_from_chunk(chunk)
-                if features:
-                    all_features.append(features)
+            if chunks:
+                with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                    futures = [executor.submit(self._request_chunk_features, chunk) for chunk in chunks]
+                    for future in futures:
+                        try:
+                            features = future.result()
+                        except Exception as e:
+                            notices.warning(f"Error extracting features from chunk: {str(e)}")
+                            continue
+                        if features:
+                            all_features.append(features)
             
             # Combine and consolidate features
             consolidated_features = self._consolidate_features(all_features)
@@ -57,12 +178,11 @@ class AIAnalyzer:
             return consolidated_features
             
         except Exception as e:
-            st.error(f"Error in AI feature extraction: {str(e)}")
+            notices.error(f"Error in AI feature extraction: {str(e)}")
             return self._get_empty_features()
     
-    def _extract_features_from_chunk(self, text_chunk: str) -> Dict[str, Any]:
-        """Extract business features from a single text chunk"""
-        
+    def _request_chunk_features(self, text_chunk: str) -> Dict[str, Any]:
+        """Request business features for a text chunk from the LLM, raising on failure"""
         prompt = """
         Analyze the following business document text and extract key business information. 
         Return the information in JSON format with the following structure:
@@ -101,32 +221,13 @@ class AIAnalyzer:
         {text}
         """
         
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a business analyst expert at extracting structured information from business documents."},
-                    {"role": "user", "content": prompt.format(text=text_chunk)}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            # Parse JSON response
-            content = response.choices[0].message.content
-            
-            # Clean up the response to extract JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            features = json.loads(content.strip())
-            return features
-            
-        except Exception as e:
-            st.warning(f"Error extracting features from chunk: {str(e)}")
-            return {}
+        return self._complete(
+            "You are a business analyst expert at extracting structured information from business documents.",
+            prompt.format(text=text_chunk),
+            temperature=0.1,
+            max_tokens=2000,
+            parse_json=True
+        )
     
     def _consolidate_features(self, features_list: List[Dict]) -> Dict[str, Any]:
         """Consolidate features from multiple chunks"""
@@ -136,18 +237,18 @@ class AIAnalyzer:
         # Start with the first feature set
         consolidated = features_list[0].copy()
         
+        # Collect list values in insertion-ordered dicts, deduplicating as they arrive
+        merged_lists = {
+            key: dict.fromkeys(consolidated[key])
+            for key in CONSOLIDATED_LIST_KEYS if isinstance(consolidated.get(key), list)
+        }
+        
         # Merge information from other chunks
         for features in features_list[1:]:
             # Merge lists
-            for key in ['geographic_markets', 'key_products_services', 'technology_stack', 
-                       'competitive_advantages', 'strategic_objectives', 'partnerships', 
-                       'target_customers', 'risks_challenges']:
+            for key in CONSOLIDATED_LIST_KEYS:
                 if key in features and features[key]:
-                    if key not in consolidated:
-                        consolidated[key] = []
-                    consolidated[key].extend(features[key])
-                    # Remove duplicates
-                    consolidated[key] = list(set(consolidated[key]))
+                    merged_lists.setdefault(key, {}).update(dict.fromkeys(features[key]))
             
             # Update single values if not already set
             for key in ['company_name', 'industry_classification', 'business_model', 
@@ -163,6 +264,9 @@ class AIAnalyzer:
                     if rev_value and not consolidated['revenue_info'].get(rev_key):
                         consolidated['revenue_info'][rev_key] = rev_value
         
+        for key, values in merged_lists.items():
+            consolidated[key] = list(values)
+        
         return consolidated
     
     def _get_empty_features(self) -> Dict[str, Any]:
@@ -198,84 +302,75 @@ class AIAnalyzer:
             Dictionary containing synergy analysis
         """
         try:
-            prompt = """
-            Analyze the potential merger synergies between these two companies and provide a detailed assessment.
-            
-            User Company:
-            {user_company}
-            
-            Candidate Company:
-            {candidate_company}
-            
-            Provide analysis in the following JSON format:
-            {{
-                "overall_match_score": 0.85,
-                "match_type": "horizontal" or "vertical",
-                "synergy_predictions": {{
-                    "revenue_synergies": {{
-                        "cross_selling_opportunities": "description and estimated value",
-                        "market_expansion": "description and estimated value",
-                        "pricing_power": "description and estimated value",
-                        "total_revenue_uplift": "estimated percentage or amount"
-                    }},
-                    "cost_synergies": {{
-                        "operational_efficiencies": "description and estimated savings",
-                        "technology_integration": "description and estimated savings",
-                        "administrative_savings": "description and estimated savings",
-                        "procurement_savings": "description and estimated savings",
-                        "total_cost_savings": "estimated percentage or amount"
-                    }},
-                    "strategic_synergies": {{
-                        "market_position": "how combined entity improves market position",
-                        "competitive_advantages": "new competitive advantages created",
-                        "innovation_capabilities": "enhanced innovation potential",
-                        "geographic_expansion": "geographic expansion opportunities"
-                    }}
-                }},
-                "risk_assessment": {{
-                    "integration_complexity": "high/medium/low with explanation",
-                    "cultural_fit": "assessment of cultural compatibility",
-                    "regulatory_concerns": "potential regulatory issues",
-                    "market_risks": "market-related risks",
-                    "execution_risks": "risks in executing the merger"
-                }},
-                "confidence_score": 0.75,
-                "key_value_drivers": ["list of top 3-5 value creation drivers"],
-                "implementation_timeline": "estimated timeline for realizing synergies",
-                "recommended_structure": "recommended transaction structure"
-            }}
-            
-            Provide specific, quantitative estimates where possible. Be realistic about challenges and risks.
-            """
-            
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert M&A analyst with deep experience in synergy analysis and valuation."},
-                    {"role": "user", "content": prompt.format(
-                        user_company=json.dumps(user_company, indent=2),
-                        candidate_company=json.dumps(candidate_company, indent=2)
-                    )}
-                ],
-                temperature=0.2,
-                max_tokens=3000
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Clean up the response to extract JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            analysis = json.loads(content.strip())
-            return analysis
+            return self.request_synergy_analysis(user_company, candidate_company)
             
         except Exception as e:
-            st.error(f"Error in synergy analysis: {str(e)}")
+            notices.error(f"Error in synergy analysis: {str(e)}")
             return self._get_empty_synergy_analysis()
     
+    def request_synergy_analysis(self, user_company: Dict, candidate_company: Dict) -> Dict[str, Any]:
+        """Request a synergy analysis from the LLM, raising on failure"""
+        prompt = """
+        Analyze the potential merger synergies between these two companies and provide a detailed assessment.
+        
+        User Company:
+        {user_company}
+        
+        Candidate Company:
+        {candidate_company}
+        
+        Provide analysis in the following JSON format:
+        {{
+            "overall_match_score": 0.85,
+            "match_type": "horizontal" or "vertical",
+            "synergy_predictions": {{
+                "revenue_synergies": {{
+                    "cross_selling_opportunities": "description and estimated value",
+                    "market_expansion": "description and estimated value",
+                    "pricing_power": "description and estimated value",
+                    "total_revenue_uplift": "estimated percentage or amount"
+                }},
+                "cost_synergies": {{
+                    "operational_efficiencies": "description and estimated savings",
+                    "technology_integration": "description and estimated savings",
+                    "administrative_savings": "description and estimated savings",
+                    "procurement_savings": "description and estimated savings",
+                    "total_cost_savings": "estimated percentage or amount"
+                }},
+                "strategic_synergies": {{
+                    "market_position": "how combined entity improves market position",
+                    "competitive_advantages": "new competitive advantages created",
+                    "innovation_capabilities": "enhanced innovation potential",
+                    "geographic_expansion": "geographic expansion opportunities"
+                }}
+            }},
+            "risk_assessment": {{
+                "integration_complexity": "high/medium/low with explanation",
+                "cultural_fit": "assessment of cultural compatibility",
+                "regulatory_concerns": "potential regulatory issues",
+                "market_risks": "market-related risks",
+                "execution_risks": "risks in executing the merger"
+            }},
+            "confidence_score": 0.75,
+            "key_value_drivers": ["list of top 3-5 value creation drivers"],
+            "implementation_timeline": "estimated timeline for realizing synergies",
+            "recommended_structure": "recommended transaction structure"
+        }}
+        
+        Provide specific, quantitative estimates where possible. Be realistic about challenges and risks.
+        """
+        
+        return self._complete(
+            "You are an expert M&A analyst with deep experience in synergy analysis and valuation.",
+            prompt.format(
+                user_company=orjson.dumps(user_company, option=PROMPT_JSON_OPTIONS).decode(),
+                candidate_company=orjson.dumps(candidate_company, option=PROMPT_JSON_OPTIONS).decode()
+            ),
+            temperature=0.2,
+            max_tokens=3000,
+            parse_json=True
+        )
+    
     def _get_empty_synergy_analysis(self) -> Dict[str, Any]:
         """Return empty synergy analysis structure"""
         return {
@@ -306,38 +401,20 @@ class AIAnalyzer:
             Summary:
             """
             
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a business analyst who creates clear, concise company summaries."},
-                    {"role": "user", "content": prompt.format(features=json.dumps(business_features, indent=2))}
-                ],
+            return self._complete(
+                "You are a business analyst who creates clear, concise company summaries.",
+                prompt.format(features=orjson.dumps(business_features, option=PROMPT_JSON_OPTIONS).decode()),
                 temperature=0.3,
                 max_tokens=200
             )
             
-            return response.choices[0].message.content.strip()
-            
         except Exception as e:
-            st.warning(f"Error generating company summary: {str(e)}")
+            notices.warning(f"Error generating company summary: {str(e)}")
             return "Company summary not available."
     
     def classify_industry(self, business_features: Dict) -> str:
         """Classify company industry based on business features"""
         try:
-            # Simple classification based on keywords
-            industry_keywords = {
-                'Technology': ['software', 'saas', 'platform', 'api', 'cloud', 'ai', 'machine learning'],
-                'Financial Services': ['fintech', 'payment', 'banking', 'insurance', 'investment'],
-                'Healthcare': ['healthcare', 'medical', 'biotech', 'pharmaceutical', 'health'],
-                'Manufacturing': ['manufacturing', 'production', 'factory', 'industrial'],
-                'Retail': ['retail', 'e-commerce', 'consumer', 'marketplace'],
-                'Energy': ['energy', 'oil', 'gas', 'renewable', 'solar', 'wind'],
-                'Real Estate': ['real estate', 'property', 'construction', 'development'],
-                'Transportation': ['transportation', 'logistics', 'shipping', 'delivery'],
-                'Media': ['media', 'entertainment', 'content', 'publishing', 'advertising']
-            }
-            
             # Check business features for industry keywords
             text_to_check = ' '.join([
                 str(business_features.get('industry_classification', '')),
@@ -346,10 +423,10 @@ class AIAnalyzer:
                 ' '.join(business_features.get('technology_stack', []))
             ]).lower()
             
-            for industry, keywords in industry_keywords.items():
-                for keyword in keywords:
-                    if keyword in text_to_check:
-                        return industry
+            hits = INDUSTRY_KEYWORD_MATCHER.find(text_to_check)
+            for industry, keywords in INDUSTRY_KEYWORDS.items():
+                if not hits.isdisjoint(keywords):
+                    return industry
             
             # Fallback to AI classification
             if business_features.get('industry_classification'):
@@ -0,0 +1,36 @@
+"""
+Page bootstrap for Merger Book MVP
+Single import point for the configuration and shared resources used by every page
+"""
+
+import streamlit as st
+from utils.config import Config
+from utils._singletons import (
+    get_db,
+    fetch_companies,
+    get_config_status,
+    get_doc_processor,
+    get_ai_analyzer,
+    get_matching_engine,
+    get_financial_manager,
+    get_job_executor
+)
+
+# Icons for document processing states
+DOCUMENT_STATUS_ICONS = {
+    'uploaded': '📄',
+    'processing': '⏳',
+    'completed': '✅',
+    'error': '❌'
+}
+
+# Default user for testing (no authentication)
+SESSION_DEFAULTS = {
+    'user_id': 1,
+    'username': 'test_user'
+}
+
+def init_session_defaults():
+    """Populate session state with the default user values"""
+    for key, value in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
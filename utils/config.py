@@ -3,7 +3,7 @@ Configuration management for Merger Book MVP
 """
 
 import os
-from typing import Dict, Any
+from typing import Dict, Any, FrozenSet
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -27,7 +27,7 @@ class Config:
     # File upload configuration
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'data/uploads')
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 50 * 1024 * 1024))  # 50MB
-    ALLOWED_EXTENSIONS = {'pdf', 'docx', 'pptx', 'doc', 'ppt'}
+    ALLOWED_EXTENSIONS: FrozenSet[str] = frozenset({'pdf', 'docx', 'pptx', 'doc', 'ppt'})
     
     # Application settings
     SECRET_KEY = os.getenv('SECRET_KEY', 'merger-book-secret-key-change-in-production')
@@ -57,7 +57,9 @@ class Config:
         
         # Create required directories
         os.makedirs(cls.UPLOAD_FOLDER, exist_ok=True)
-        os.makedirs(os.path.dirname(cls.DATABASE_PATH), exist_ok=True)
+        db_dir = os.path.dirname(cls.DATABASE_PATH)
+        if db_dir:  # Empty for in-memory or bare-filename databases
+            os.makedirs(db_dir, exist_ok=True)
         
         return {
             'valid': len(issues) == 0,
@@ -3,19 +3,237 @@ Database models and schema for Merger Book MVP
 """
 
 import sqlite3
-import json
+import atexit
+import orjson
+import hmac
 import hashlib
+import threading
+import weakref
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple, Set, Iterator
 import os
 
+# scrypt cost parameters for password hashing
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1, 'dklen': 32}
+
+# Length of the random per-user password salt
+PASSWORD_SALT_BYTES = 16
+
+def hash_password(password: str, salt: bytes) -> str:
+    """Derive a hex password hash with scrypt"""
+    return hashlib.scrypt(password.encode(), salt=salt, **SCRYPT_PARAMS).hex()
+
+def dumps_json(value: Any) -> str:
+    """Serialize a value for a JSON text column"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+# Stored for missing JSON object fields, matching the schema's column default
+EMPTY_JSON_OBJECT = '{}'
+
+def dumps_json_field(data: Dict, key: str) -> str:
+    """Serialize an optional JSON object field, skipping the encoder when it is absent or empty"""
+    value = data.get(key)
+    if value is None or value == {}:
+        return EMPTY_JSON_OBJECT
+    return dumps_json(value)
+
+def loads_json(value: Any) -> Any:
+    """Parse a JSON text column value"""
+    return orjson.loads(value)
+
+# Bump whenever _SCHEMA_SQL changes so existing databases re-run it
+SCHEMA_VERSION = 6
+
+# Full schema, applied in one transaction by init_database
+_SCHEMA_SQL = """
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    password_salt BLOB,
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP,
+    subscription_level TEXT DEFAULT 'free',
+    preferences TEXT DEFAULT '{}',
+    is_active BOOLEAN DEFAULT 1
+);
+
+-- Companies table
+CREATE TABLE IF NOT EXISTS companies (
+    company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name TEXT NOT NULL,
+    ticker_symbol TEXT,
+    industry_classification TEXT,
+    revenue REAL,
+    employee_count INTEGER,
+    geographic_markets TEXT,
+    business_description TEXT,
+    financial_metrics TEXT DEFAULT '{}',
+    strategic_objectives TEXT DEFAULT '{}',
+    data_source TEXT NOT NULL CHECK (data_source IN ('user_upload', 'market_data')),
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- Full-text index over company search fields, kept in sync by triggers. The trigram
+-- tokenizer matches substrings anywhere in a word; the index is recreated on every
+-- migration so tokenizer changes apply, and repopulated by the rebuild below
+DROP TABLE IF EXISTS companies_fts;
+CREATE VIRTUAL TABLE companies_fts USING fts5(
+    company_name, business_description, industry_classification,
+    content='companies', content_rowid='company_id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS companies_fts_insert AFTER INSERT ON companies BEGIN
+    INSERT INTO companies_fts(rowid, company_name, business_description, industry_classification)
+    VALUES (new.company_id, new.company_name, new.business_description, new.industry_classification);
+END;
+
+CREATE TRIGGER IF NOT EXISTS companies_fts_delete AFTER DELETE ON companies BEGIN
+    INSERT INTO companies_fts(companies_fts, rowid, company_name, business_description, industry_classification)
+    VALUES ('delete', old.company_id, old.company_name, old.business_description, old.industry_classification);
+END;
+
+CREATE TRIGGER IF NOT EXISTS companies_fts_update AFTER UPDATE ON companies BEGIN
+    INSERT INTO companies_fts(companies_fts, rowid, company_name, business_description, industry_classification)
+    VALUES ('delete', old.company_id, old.company_name, old.business_description, old.industry_classification);
+    INSERT INTO companies_fts(rowid, company_name, business_description, industry_classification)
+    VALUES (new.company_id, new.company_name, new.business_description, new.industry_classification);
+END;
+
+-- Documents table
+CREATE TABLE IF NOT EXISTS documents (
+    document_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    file_path TEXT,
+    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processing_status TEXT DEFAULT 'uploaded' CHECK (processing_status IN ('uploaded', 'processing', 'completed', 'error')),
+    extracted_content TEXT DEFAULT '{}',
+    business_features TEXT DEFAULT '{}',
+    error_messages TEXT,
+    file_size INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- Matches table
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_company_id INTEGER NOT NULL,
+    candidate_company_id INTEGER NOT NULL,
+    match_score REAL NOT NULL,
+    match_type TEXT NOT NULL CHECK (match_type IN ('horizontal', 'vertical')),
+    synergy_predictions TEXT DEFAULT '{}',
+    risk_assessment TEXT DEFAULT '{}',
+    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    analysis_version TEXT DEFAULT '1.0',
+    confidence_score REAL,
+    FOREIGN KEY (user_company_id) REFERENCES companies (company_id),
+    FOREIGN KEY (candidate_company_id) REFERENCES companies (company_id)
+);
+
+-- Analysis Results table
+CREATE TABLE IF NOT EXISTS analysis_results (
+    analysis_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id INTEGER NOT NULL,
+    analysis_type TEXT NOT NULL,
+    financial_projections TEXT DEFAULT '{}',
+    synergy_breakdown TEXT DEFAULT '{}',
+    risk_factors TEXT DEFAULT '{}',
+    confidence_score REAL,
+    generated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    model_version TEXT DEFAULT '1.0',
+    FOREIGN KEY (match_id) REFERENCES matches (match_id)
+);
+
+-- Per-industry market data aggregates, rebuilt whenever market data companies are written
+CREATE TABLE IF NOT EXISTS market_stats_cache (
+    industry_classification TEXT,
+    company_count INTEGER NOT NULL,
+    revenue_companies INTEGER NOT NULL,
+    revenue_total REAL,
+    max_revenue REAL,
+    min_revenue REAL,
+    employee_companies INTEGER NOT NULL,
+    employee_total REAL,
+    max_employees INTEGER,
+    min_employees INTEGER,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_companies_industry ON companies(industry_classification);
+CREATE INDEX IF NOT EXISTS idx_companies_name ON companies(company_name);
+CREATE INDEX IF NOT EXISTS idx_companies_user_lower_name ON companies(user_id, LOWER(company_name));
+CREATE INDEX IF NOT EXISTS idx_companies_data_source ON companies(data_source);
+CREATE INDEX IF NOT EXISTS idx_companies_user_source ON companies(user_id, data_source);
+CREATE INDEX IF NOT EXISTS idx_companies_user_source_industry ON companies(user_id, data_source, industry_classification);
+CREATE INDEX IF NOT EXISTS idx_companies_industry_source ON companies(industry_classification, data_source);
+CREATE INDEX IF NOT EXISTS idx_companies_source_revenue ON companies(data_source, revenue DESC);
+CREATE INDEX IF NOT EXISTS idx_companies_empty ON companies(data_source)
+    WHERE (revenue IS NULL OR revenue = 0);
+CREATE INDEX IF NOT EXISTS idx_documents_user ON documents(user_id);
+CREATE INDEX IF NOT EXISTS idx_documents_user_status ON documents(user_id, processing_status);
+CREATE INDEX IF NOT EXISTS idx_documents_user_date ON documents(user_id, upload_date DESC);
+CREATE INDEX IF NOT EXISTS idx_matches_user_score ON matches(user_company_id, match_score DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_match_date ON analysis_results(match_id, generated_date DESC);
+
+-- Sync the FTS index with existing companies first, so the delete trigger below only
+-- removes rows that were actually indexed (indexes older rows on first creation too)
+INSERT INTO companies_fts(companies_fts) VALUES ('rebuild');
+
+-- Fold duplicate market data tickers into their oldest row before enforcing uniqueness
+UPDATE matches SET candidate_company_id = (
+    SELECT MIN(k.company_id) FROM companies c
+    JOIN companies k ON k.ticker_symbol = c.ticker_symbol AND k.data_source = 'market_data'
+    WHERE c.company_id = matches.candidate_company_id
+)
+WHERE candidate_company_id IN (
+    SELECT company_id FROM companies
+    WHERE data_source = 'market_data' AND ticker_symbol IS NOT NULL
+      AND company_id NOT IN (
+          SELECT MIN(company_id) FROM companies
+          WHERE data_source = 'market_data' AND ticker_symbol IS NOT NULL
+          GROUP BY ticker_symbol
+      )
+);
+DELETE FROM companies
+WHERE data_source = 'market_data' AND ticker_symbol IS NOT NULL
+  AND company_id NOT IN (
+      SELECT MIN(company_id) FROM companies
+      WHERE data_source = 'market_data' AND ticker_symbol IS NOT NULL
+      GROUP BY ticker_symbol
+  );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_companies_market_ticker ON companies(ticker_symbol)
+    WHERE data_source = 'market_data';
+
+-- Superseded by idx_matches_user_score
+DROP INDEX IF EXISTS idx_matches_user_company;
+DROP INDEX IF EXISTS idx_matches_score;
+"""
+
 class DatabaseManager:
     """Manages SQLite database operations for Merger Book"""
     
     def __init__(self, db_path: str = "data/merger_book.db"):
         self.db_path = db_path
-        self.ensure_db_directory()
+        self._local = threading.local()
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self._memory_uri = None
+        if db_path in (':memory:', ''):
+            # Each plain ':memory:' connection is a separate empty database, so per-thread
+            # connections share one named in-memory database kept alive by an anchor connection
+            self._memory_uri = f"file:merger_book_{id(self)}?mode=memory&cache=shared"
+            self._memory_anchor = sqlite3.connect(self._memory_uri, uri=True, check_same_thread=False)
+        else:
+            self.ensure_db_directory()
         self.init_database()
+        atexit.register(self.close)
     
     def ensure_db_directory(self):
         """Ensure the database directory exists"""
@@ -23,142 +241,120 @@ class DatabaseManager:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this thread's database connection, opening and configuring it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # The manager is shared across Streamlit script threads via st.cache_resource,
+            # so each thread keeps its own long-lived connection
+            if self._memory_uri:
+                conn = sqlite3.connect(self._memory_uri, uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row  # Enable dict-like access
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+            # Script reruns and pool workers come and go, so close the connection with its thread
+            weakref.finalize(threading.current_thread(), self._close_connection, conn)
         return conn
     
+    def _close_connection(self, conn: sqlite3.Connection):
+        """Refresh query planner statistics and close one connection"""
+        with self._connections_lock:
+            self._connections.discard(conn)
+        try:
+            # Analyzes only the tables this connection's queries would benefit from
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        conn.close()
+    
+    def close(self):
+        """Close every thread's open connection"""
+        with self._connections_lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._close_connection(conn)
+        self._local = threading.local()
+        if self._memory_uri:
+            self._memory_anchor.close()
+            self._memory_uri = None
+    
     def init_database(self):
         """Initialize database with required tables"""
         with self.get_connection() as conn:
-            # Users table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    subscription_level TEXT DEFAULT 'free',
-                    preferences TEXT DEFAULT '{}',
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Companies table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS companies (
-                    company_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    company_name TEXT NOT NULL,
-                    ticker_symbol TEXT,
-                    industry_classification TEXT,
-                    revenue REAL,
-                    employee_count INTEGER,
-                    geographic_markets TEXT,
-                    business_description TEXT,
-                    financial_metrics TEXT DEFAULT '{}',
-                    strategic_objectives TEXT DEFAULT '{}',
-                    data_source TEXT NOT NULL CHECK (data_source IN ('user_upload', 'market_data')),
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    user_id INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+            # Skip the DDL entirely once this database is on the current schema
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
             
-            # Documents table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    document_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    filename TEXT NOT NULL,
-                    file_type TEXT NOT NULL,
-                    file_path TEXT,
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processing_status TEXT DEFAULT 'uploaded' CHECK (processing_status IN ('uploaded', 'processing', 'completed', 'error')),
-                    extracted_content TEXT DEFAULT '{}',
-                    business_features TEXT DEFAULT '{}',
-                    error_messages TEXT,
-                    file_size INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+            # WAL lets readers proceed while another session writes
+            conn.execute("PRAGMA journal_mode=WAL")
             
-            # Matches table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS matches (
-                    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_company_id INTEGER NOT NULL,
-                    candidate_company_id INTEGER NOT NULL,
-                    match_score REAL NOT NULL,
-                    match_type TEXT NOT NULL CHECK (match_type IN ('horizontal', 'vertical')),
-                    synergy_predictions TEXT DEFAULT '{}',
-                    risk_assessment TEXT DEFAULT '{}',
-                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    analysis_version TEXT DEFAULT '1.0',
-                    confidence_score REAL,
-                    FOREIGN KEY (user_company_id) REFERENCES companies (company_id),
-                    FOREIGN KEY (candidate_company_id) REFERENCES companies (company_id)
-                )
-            """)
+            # executescript runs statements as written, so wrap the DDL in one explicit transaction
+            conn.executescript(f"BEGIN;\n{_SCHEMA_SQL}\nCOMMIT;")
             
-            # Analysis Results table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS analysis_results (
-                    analysis_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    match_id INTEGER NOT NULL,
-                    analysis_type TEXT NOT NULL,
-                    financial_projections TEXT DEFAULT '{}',
-                    synergy_breakdown TEXT DEFAULT '{}',
-                    risk_factors TEXT DEFAULT '{}',
-                    confidence_score REAL,
-                    generated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    model_version TEXT DEFAULT '1.0',
-                    FOREIGN KEY (match_id) REFERENCES matches (match_id)
-                )
-            """)
+            # Columns added after the first release
+            user_columns = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+            if 'password_salt' not in user_columns:
+                conn.execute("ALTER TABLE users ADD COLUMN password_salt BLOB")
             
-            # Create indexes for better performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_companies_industry ON companies(industry_classification)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_companies_data_source ON companies(data_source)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_user ON documents(user_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_user_company ON matches(user_company_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_score ON matches(match_score)")
+            # Rebuilt on every migration, since duplicate market rows may have been folded away
+            self._refresh_market_stats(conn)
             
-            conn.commit()
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     
     # User management methods
     def create_user(self, username: str, email: str, password: str) -> int:
         """Create a new user"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_salt = os.urandom(PASSWORD_SALT_BYTES)
+        password_hash = hash_password(password, password_salt)
         
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                INSERT INTO users (username, email, password_hash)
-                VALUES (?, ?, ?)
-            """, (username, email, password_hash))
-            return cursor.lastrowid
+                INSERT INTO users (username, email, password_hash, password_salt)
+                VALUES (?, ?, ?, ?)
+                RETURNING user_id
+            """, (username, email, password_hash, password_salt))
+            return cursor.fetchone()[0]
     
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """Authenticate user and return user info"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                SELECT * FROM users 
-                WHERE username = ? AND password_hash = ? AND is_active = 1
-            """, (username, password_hash))
-            
+                SELECT user_id, password_hash, password_salt FROM users
+                WHERE username = ? AND is_active = 1
+            """, (username,))
             user = cursor.fetchone()
-            if user:
-                # Update last login
-                conn.execute("""
-                    UPDATE users SET last_login = CURRENT_TIMESTAMP 
-                    WHERE user_id = ?
-                """, (user['user_id'],))
-                return dict(user)
+        
+        if not user:
             return None
+        
+        if user['password_salt'] is None:
+            # Accounts created before salted hashing store a bare SHA-256 digest
+            expected = hashlib.sha256(password.encode()).hexdigest()
+        else:
+            expected = hash_password(password, user['password_salt'])
+        if not hmac.compare_digest(user['password_hash'], expected):
+            return None
+        
+        # Stamp the login, rehashing legacy accounts with a fresh salt
+        password_hash, password_salt = user['password_hash'], user['password_salt']
+        if password_salt is None:
+            password_salt = os.urandom(PASSWORD_SALT_BYTES)
+            password_hash = hash_password(password, password_salt)
+        
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE users SET last_login = CURRENT_TIMESTAMP, password_hash = ?, password_salt = ?
+                WHERE user_id = ?
+                RETURNING *
+            """, (password_hash, password_salt, user['user_id']))
+            return dict(cursor.fetchone())
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user by ID"""
@@ -168,38 +364,333 @@ class DatabaseManager:
             return dict(user) if user else None
     
     # Company management methods
+    _COMPANY_INSERT = """
+        INSERT INTO companies (
+            company_name, ticker_symbol, industry_classification, revenue,
+            employee_count, geographic_markets, business_description,
+            financial_metrics, strategic_objectives, data_source, user_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (ticker_symbol) WHERE data_source = 'market_data' DO UPDATE SET
+            company_name = excluded.company_name,
+            industry_classification = excluded.industry_classification,
+            revenue = excluded.revenue,
+            employee_count = excluded.employee_count,
+            geographic_markets = excluded.geographic_markets,
+            business_description = excluded.business_description,
+            financial_metrics = excluded.financial_metrics,
+            last_updated = CURRENT_TIMESTAMP
+        RETURNING company_id
+    """
+    
+    @staticmethod
+    def _company_params(company_data: Dict) -> Tuple:
+        """Insert parameters for a company record"""
+        return (
+            company_data.get('company_name'),
+            company_data.get('ticker_symbol'),
+            company_data.get('industry_classification'),
+            company_data.get('revenue'),
+            company_data.get('employee_count'),
+            company_data.get('geographic_markets'),
+            company_data.get('business_description'),
+            dumps_json_field(company_data, 'financial_metrics'),
+            dumps_json_field(company_data, 'strategic_objectives'),
+            company_data.get('data_source', 'user_upload'),
+            company_data.get('user_id')
+        )
+    
     def create_company(self, company_data: Dict) -> int:
         """Create a new company record"""
+        return self.create_companies([company_data])[0]
+    
+    def create_companies(self, companies: List[Dict]) -> List[int]:
+        """Create several company records in a single transaction, refreshing market tickers already stored"""
+        company_ids = []
+        with self.get_connection() as conn:
+            for company_data in companies:
+                cursor = conn.execute(self._COMPANY_INSERT, self._company_params(company_data))
+                company_ids.append(cursor.fetchone()[0])
+            
+            # Keep the market aggregates in step with the rows written in this transaction
+            if any(company_data.get('data_source') == 'market_data' for company_data in companies):
+                self._refresh_market_stats(conn)
+        return company_ids
+    
+    def update_company_financials(self, company_id: int, company_data: Dict):
+        """Update a company's financial fields, rebuilding market aggregates for market data rows"""
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                INSERT INTO companies (
-                    company_name, ticker_symbol, industry_classification, revenue,
-                    employee_count, geographic_markets, business_description,
-                    financial_metrics, strategic_objectives, data_source, user_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                UPDATE companies SET 
+                    revenue = ?,
+                    employee_count = ?,
+                    business_description = ?,
+                    financial_metrics = ?,
+                    last_updated = CURRENT_TIMESTAMP
+                WHERE company_id = ?
+                RETURNING data_source
             """, (
-                company_data.get('company_name'),
-                company_data.get('ticker_symbol'),
-                company_data.get('industry_classification'),
                 company_data.get('revenue'),
                 company_data.get('employee_count'),
-                company_data.get('geographic_markets'),
                 company_data.get('business_description'),
-                json.dumps(company_data.get('financial_metrics', {})),
-                json.dumps(company_data.get('strategic_objectives', {})),
-                company_data.get('data_source', 'user_upload'),
-                company_data.get('user_id')
+                dumps_json_field(company_data, 'financial_metrics'),
+                company_id
             ))
-            return cursor.lastrowid
+            row = cursor.fetchone()
+            if row and row[0] == 'market_data':
+                self._refresh_market_stats(conn)
+    
+    def get_market_tickers(self) -> Set[str]:
+        """Ticker symbols of all market data companies"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT ticker_symbol FROM companies
+                WHERE data_source = 'market_data' AND ticker_symbol IS NOT NULL
+            """)
+            return {row[0] for row in cursor.fetchall()}
+    
+    def get_market_catalog_columns(self) -> Dict[str, Any]:
+        """
+        Load the market data catalog column-wise for vectorized scans
+        
+        Returns:
+            Dictionary of equal-length arrays ordered by company_id; missing
+            revenue and employee counts are NaN
+        """
+        import numpy as np
+        
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT company_id, company_name, industry_classification, revenue, employee_count
+                FROM companies
+                WHERE data_source = 'market_data'
+                ORDER BY company_id
+            """).fetchall()
+        
+        company_ids, names, industries, revenues, employees = zip(*rows) if rows else ((),) * 5
+        return {
+            'company_id': np.array(company_ids, dtype=np.int64),
+            'company_name': np.array(names, dtype=object),
+            'industry': np.array(industries, dtype=object),
+            'revenue': np.array(revenues, dtype=np.float64),
+            'employee_count': np.array(employees, dtype=np.float64)
+        }
     
     def get_companies_by_user(self, user_id: int) -> List[Dict]:
         """Get all companies for a user"""
+        return list(self.iter_companies_by_user(user_id))
+    
+    def iter_companies_by_user(self, user_id: int) -> Iterator[Dict]:
+        """Yield a user's visible companies one row at a time, without materializing the result"""
         with self.get_connection() as conn:
             cursor = conn.execute("""
                 SELECT * FROM companies WHERE user_id = ? OR data_source = 'market_data'
                 ORDER BY company_name
             """, (user_id,))
-            return [dict(row) for row in cursor.fetchall()]
+            for row in cursor:
+                yield dict(row)
+    
+    @staticmethod
+    def _company_filter_clause(user_id: int, data_source: Optional[str] = None,
+                               industry: Optional[str] = None,
+                               search: Optional[str] = None,
+                               with_ticker: bool = False) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause and parameters shared by the filtered company queries"""
+        # Narrow the visibility rule when a source is given so the
+        # (user_id, data_source) / data_source indexes can be used directly
+        if data_source == 'market_data':
+            clauses = ["data_source = 'market_data'"]
+            params: List[Any] = []
+        elif data_source:
+            clauses = ["user_id = ?", "data_source = ?"]
+            params = [user_id, data_source]
+        else:
+            clauses = ["(user_id = ? OR data_source = 'market_data')"]
+            params = [user_id]
+        
+        if with_ticker:
+            clauses.append("ticker_symbol IS NOT NULL AND ticker_symbol != ''")
+        
+        if industry:
+            # Companies without a classification are listed as 'Unknown'
+            clauses.append("COALESCE(industry_classification, 'Unknown') = ?")
+            params.append(industry)
+        
+        # Case-insensitive substring of the name, description or industry
+        search = search.strip() if search else ''
+        if len(search) >= 3:
+            # A quoted trigram phrase matches the whole search text as a substring
+            clauses.append("company_id IN (SELECT rowid FROM companies_fts WHERE companies_fts MATCH ?)")
+            params.append('"{}"'.format(search.replace('"', '""')))
+        elif search:
+            # Trigram queries need at least three characters, so scan shorter text with LIKE
+            pattern = '%{}%'.format(search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            clauses.append(
+                "(company_name LIKE ? ESCAPE '\\' OR business_description LIKE ? ESCAPE '\\'"
+                " OR industry_classification LIKE ? ESCAPE '\\')"
+            )
+            params.extend([pattern] * 3)
+        
+        return " AND ".join(clauses), params
+    
+    def get_companies_filtered(self, user_id: int, data_source: Optional[str] = None,
+                               industry: Optional[str] = None, search: Optional[str] = None,
+                               with_ticker: bool = False,
+                               limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """
+        Get companies visible to a user, filtered and paged in SQL
+        
+        Args:
+            user_id: Owner of uploaded companies; market data is always visible
+            data_source: Restrict to 'user_upload' or 'market_data'
+            industry: Exact industry classification ('Unknown' matches unclassified)
+            search: Free text matched by word prefix against name, description and industry
+            with_ticker: Only include companies that have a ticker symbol
+            limit: Maximum number of rows to return
+            offset: Number of rows to skip
+            
+        Returns:
+            Company rows ordered by name
+        """
+        where, params = self._company_filter_clause(user_id, data_source, industry, search, with_ticker)
+        query = f"SELECT * FROM companies WHERE {where} ORDER BY company_name"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        
+        with self.get_connection() as conn:
+            cursor = conn.execute(query, params)
+            return [dict(row) for row in cursor]
+    
+    def count_companies_filtered(self, user_id: int, data_source: Optional[str] = None,
+                                 industry: Optional[str] = None, search: Optional[str] = None,
+                                 with_ticker: bool = False) -> int:
+        """Count companies matching the same filters as get_companies_filtered"""
+        where, params = self._company_filter_clause(user_id, data_source, industry, search, with_ticker)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f"SELECT COUNT(*) FROM companies WHERE {where}", params)
+            return cursor.fetchone()[0]
+    
+    def get_company_counts_by_industry(self, user_id: int) -> List[Dict]:
+        """Count companies visible to a user per industry and data source"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT COALESCE(industry_classification, 'Unknown') AS industry,
+                       data_source, COUNT(*) AS company_count
+                FROM companies
+                WHERE user_id = ? OR data_source = 'market_data'
+                GROUP BY 1, 2
+                ORDER BY 1
+            """, (user_id,))
+            return [dict(row) for row in cursor]
+    
+    def has_market_data(self) -> bool:
+        """Check whether any market data companies exist"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM companies WHERE data_source = 'market_data')"
+            )
+            return bool(cursor.fetchone()[0])
+    
+    def cleanup_database(self, user_id: int, remove_duplicates: bool = False,
+                         remove_failed_documents: bool = False,
+                         remove_empty_companies: bool = False,
+                         reset_matches: bool = False) -> Dict[str, int]:
+        """
+        Run the selected cleanup operations in one transaction
+        
+        Args:
+            user_id: User whose companies and documents are cleaned up
+            remove_duplicates: Keep only the oldest company per name and source
+            remove_failed_documents: Delete documents whose processing failed
+            remove_empty_companies: Delete market companies with no revenue or employee data
+            reset_matches: Delete all match and analysis results
+        
+        Returns:
+            Number of rows removed per operation that ran
+        """
+        removed = {}
+        with self.get_connection() as conn:
+            if remove_duplicates:
+                # Keep the oldest company per name and source, folding the rest into it
+                ranked = """
+                    WITH ranked AS (
+                        SELECT company_id, MIN(company_id) OVER (
+                            PARTITION BY LOWER(company_name), data_source
+                        ) AS keeper_id
+                        FROM companies
+                        WHERE user_id = ? OR data_source = 'market_data'
+                    )
+                """
+                
+                # Repoint matches first, so they and their analysis results survive the delete
+                for column in ('user_company_id', 'candidate_company_id'):
+                    conn.execute(f"""
+                        {ranked}
+                        UPDATE matches SET {column} = (
+                            SELECT keeper_id FROM ranked WHERE ranked.company_id = matches.{column}
+                        )
+                        WHERE {column} IN (SELECT company_id FROM ranked WHERE company_id != keeper_id)
+                    """, (user_id,))
+                
+                cursor = conn.execute(f"""
+                    {ranked}
+                    DELETE FROM companies
+                    WHERE company_id IN (SELECT company_id FROM ranked WHERE company_id != keeper_id)
+                    RETURNING company_id
+                """, (user_id,))
+                removed['duplicate_companies'] = len(cursor.fetchall())
+            
+            if remove_failed_documents:
+                cursor = conn.execute("""
+                    DELETE FROM documents 
+                    WHERE processing_status = 'error' AND user_id = ?
+                """, (user_id,))
+                removed['failed_documents'] = cursor.rowcount
+            
+            if remove_empty_companies:
+                cursor = conn.execute("""
+                    DELETE FROM companies 
+                    WHERE (revenue IS NULL OR revenue = 0) 
+                    AND (employee_count IS NULL OR employee_count = 0)
+                    AND data_source = 'market_data'
+                """)
+                removed['empty_companies'] = cursor.rowcount
+            
+            if reset_matches:
+                # Unfiltered deletes on trigger-free tables take SQLite's truncate fast path,
+                # and rowcount still reports the rows removed
+                removed['matches'] = conn.execute("DELETE FROM matches").rowcount
+                removed['analysis_results'] = conn.execute("DELETE FROM analysis_results").rowcount
+            
+            if remove_duplicates or remove_empty_companies:
+                self._refresh_market_stats(conn)
+        return removed
+    
+    @staticmethod
+    def _refresh_market_stats(conn: sqlite3.Connection):
+        """Replace market_stats_cache with fresh per-industry aggregates"""
+        conn.execute("DELETE FROM market_stats_cache")
+        conn.execute("""
+            INSERT INTO market_stats_cache (
+                industry_classification, company_count,
+                revenue_companies, revenue_total, max_revenue, min_revenue,
+                employee_companies, employee_total, max_employees, min_employees
+            )
+            SELECT
+                industry_classification,
+                COUNT(*),
+                COUNT(CASE WHEN revenue > 0 THEN 1 END),
+                SUM(CASE WHEN revenue > 0 THEN revenue END),
+                MAX(CASE WHEN revenue > 0 THEN revenue END),
+                MIN(CASE WHEN revenue > 0 THEN revenue END),
+                COUNT(CASE WHEN employee_count > 0 THEN 1 END),
+                SUM(CASE WHEN employee_count > 0 THEN employee_count END),
+                MAX(CASE WHEN employee_count > 0 THEN employee_count END),
+                MIN(CASE WHEN employee_count > 0 THEN employee_count END)
+            FROM companies
+            WHERE data_source = 'market_data'
+            GROUP BY industry_classification
+        """)
     
     def get_company(self, company_id: int) -> Optional[Dict]:
         """Get company by ID"""
@@ -209,8 +700,8 @@ class DatabaseManager:
             if company:
                 result = dict(company)
                 # Parse JSON fields
-                result['financial_metrics'] = json.loads(result['financial_metrics'])
-                result['strategic_objectives'] = json.loads(result['strategic_objectives'])
+                result['financial_metrics'] = loads_json(result['financial_metrics'])
+                result['strategic_objectives'] = loads_json(result['strategic_objectives'])
                 return result
             return None
     
@@ -222,6 +713,7 @@ class DatabaseManager:
                 INSERT INTO documents (
                     user_id, filename, file_type, file_path, file_size
                 ) VALUES (?, ?, ?, ?, ?)
+                RETURNING document_id
             """, (
                 document_data['user_id'],
                 document_data['filename'],
@@ -229,7 +721,7 @@ class DatabaseManager:
                 document_data.get('file_path'),
                 document_data.get('file_size')
             ))
-            return cursor.lastrowid
+            return cursor.fetchone()[0]
     
     def update_document_processing(self, document_id: int, status: str, 
                                  extracted_content: Dict = None, 
@@ -246,20 +738,42 @@ class DatabaseManager:
                 WHERE document_id = ?
             """, (
                 status,
-                json.dumps(extracted_content) if extracted_content else None,
-                json.dumps(business_features) if business_features else None,
+                dumps_json(extracted_content) if extracted_content else None,
+                dumps_json(business_features) if business_features else None,
                 error_message,
                 document_id
             ))
     
-    def get_documents_by_user(self, user_id: int) -> List[Dict]:
-        """Get all documents for a user"""
+    def get_documents_by_user(self, user_id: int, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Get documents for a user, newest first, optionally limited"""
+        query = """
+            SELECT * FROM documents WHERE user_id = ?
+            ORDER BY upload_date DESC
+        """
+        params = [user_id]
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        
+        with self.get_connection() as conn:
+            cursor = conn.execute(query, params)
+            return [dict(row) for row in cursor]
+    
+    def get_document_count(self, user_id: int) -> int:
+        """Count all documents for a user"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("SELECT COUNT(*) FROM documents WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()[0]
+    
+    def get_document_status_counts(self, user_id: int) -> Dict[str, int]:
+        """Count a user's documents per processing status"""
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                SELECT * FROM documents WHERE user_id = ?
-                ORDER BY upload_date DESC
+                SELECT processing_status, COUNT(*) FROM documents
+                WHERE user_id = ?
+                GROUP BY processing_status
             """, (user_id,))
-            return [dict(row) for row in cursor.fetchall()]
+            return {status: count for status, count in cursor.fetchall()}
     
     def get_document(self, document_id: int) -> Optional[Dict]:
         """Get document by ID"""
@@ -270,35 +784,56 @@ class DatabaseManager:
                 result = dict(document)
                 # Parse JSON fields
                 if result['extracted_content']:
-                    result['extracted_content'] = json.loads(result['extracted_content'])
+                    result['extracted_content'] = loads_json(result['extracted_content'])
                 if result['business_features']:
-                    result['business_features'] = json.loads(result['business_features'])
+                    result['business_features'] = loads_json(result['business_features'])
                 return result
             return None
     
     # Match management methods
+    _MATCH_INSERT = """
+        INSERT INTO matches (
+            user_company_id, candidate_company_id, match_score, match_type,
+            synergy_predictions, risk_assessment, confidence_score, analysis_version
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING match_id
+    """
+    
+    @staticmethod
+    def _match_params(match_data: Dict) -> Tuple:
+        """Insert parameters for a match record"""
+        return (
+            match_data['user_company_id'],
+            match_data['candidate_company_id'],
+            match_data['match_score'],
+            match_data['match_type'],
+            dumps_json_field(match_data, 'synergy_predictions'),
+            dumps_json_field(match_data, 'risk_assessment'),
+            match_data.get('confidence_score'),
+            match_data.get('analysis_version', '1.0')
+        )
+    
     def create_match(self, match_data: Dict) -> int:
         """Create a new match record"""
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                INSERT INTO matches (
-                    user_company_id, candidate_company_id, match_score, match_type,
-                    synergy_predictions, risk_assessment, confidence_score, analysis_version
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                match_data['user_company_id'],
-                match_data['candidate_company_id'],
-                match_data['match_score'],
-                match_data['match_type'],
-                json.dumps(match_data.get('synergy_predictions', {})),
-                json.dumps(match_data.get('risk_assessment', {})),
-                match_data.get('confidence_score'),
-                match_data.get('analysis_version', '1.0')
-            ))
-            return cursor.lastrowid
+            cursor = conn.execute(self._MATCH_INSERT, self._match_params(match_data))
+            return cursor.fetchone()[0]
+    
+    def create_matches(self, matches: List[Dict]) -> List[int]:
+        """Create several match records in a single transaction"""
+        match_ids = []
+        with self.get_connection() as conn:
+            for match_data in matches:
+                cursor = conn.execute(self._MATCH_INSERT, self._match_params(match_data))
+                match_ids.append(cursor.fetchone()[0])
+        return match_ids
     
     def get_matches_by_company(self, user_company_id: int, limit: int = 50) -> List[Dict]:
         """Get matches for a user company"""
+        return list(self.iter_matches_by_company(user_company_id, limit))
+    
+    def iter_matches_by_company(self, user_company_id: int, limit: int = 50) -> Iterator[Dict]:
+        """Yield matches for a user company best first, decoding JSON fields per row"""
         with self.get_connection() as conn:
             cursor = conn.execute("""
                 SELECT m.*, c.company_name, c.ticker_symbol, c.industry_classification
@@ -309,33 +844,58 @@ class DatabaseManager:
                 LIMIT ?
             """, (user_company_id, limit))
             
-            matches = []
-            for row in cursor.fetchall():
+            for row in cursor:
                 match = dict(row)
-                match['synergy_predictions'] = json.loads(match['synergy_predictions'])
-                match['risk_assessment'] = json.loads(match['risk_assessment'])
-                matches.append(match)
-            return matches
+                match['synergy_predictions'] = loads_json(match['synergy_predictions'])
+                match['risk_assessment'] = loads_json(match['risk_assessment'])
+                yield match
+    
+    def get_match_count_for_user(self, user_id: int) -> int:
+        """Count matches across all of a user's uploaded companies"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT COUNT(*) FROM matches m
+                JOIN companies c ON m.user_company_id = c.company_id
+                WHERE c.user_id = ? AND c.data_source = 'user_upload'
+            """, (user_id,))
+            return cursor.fetchone()[0]
     
     # Analysis results methods
+    _ANALYSIS_INSERT = """
+        INSERT INTO analysis_results (
+            match_id, analysis_type, financial_projections,
+            synergy_breakdown, risk_factors, confidence_score, model_version
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        RETURNING analysis_id
+    """
+    
+    @staticmethod
+    def _analysis_params(analysis_data: Dict) -> Tuple:
+        """Insert parameters for an analysis result record"""
+        return (
+            analysis_data['match_id'],
+            analysis_data['analysis_type'],
+            dumps_json_field(analysis_data, 'financial_projections'),
+            dumps_json_field(analysis_data, 'synergy_breakdown'),
+            dumps_json_field(analysis_data, 'risk_factors'),
+            analysis_data.get('confidence_score'),
+            analysis_data.get('model_version', '1.0')
+        )
+    
     def create_analysis_result(self, analysis_data: Dict) -> int:
         """Create a new analysis result"""
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                INSERT INTO analysis_results (
-                    match_id, analysis_type, financial_projections,
-                    synergy_breakdown, risk_factors, confidence_score, model_version
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                analysis_data['match_id'],
-                analysis_data['analysis_type'],
-                json.dumps(analysis_data.get('financial_projections', {})),
-                json.dumps(analysis_data.get('synergy_breakdown', {})),
-                json.dumps(analysis_data.get('risk_factors', {})),
-                analysis_data.get('confidence_score'),
-                analysis_data.get('model_version', '1.0')
-            ))
-            return cursor.lastrowid
+            cursor = conn.execute(self._ANALYSIS_INSERT, self._analysis_params(analysis_data))
+            return cursor.fetchone()[0]
+    
+    def create_analysis_results(self, analyses: List[Dict]) -> List[int]:
+        """Create several analysis results in a single transaction"""
+        analysis_ids = []
+        with self.get_connection() as conn:
+            for analysis_data in analyses:
+                cursor = conn.execute(self._ANALYSIS_INSERT, self._analysis_params(analysis_data))
+                analysis_ids.append(cursor.fetchone()[0])
+        return analysis_ids
     
     def get_analysis_results(self, match_id: int) -> List[Dict]:
         """Get analysis results for a match"""
@@ -346,11 +906,11 @@ class DatabaseManager:
             """, (match_id,))
             
             results = []
-            for row in cursor.fetchall():
+            for row in cursor:
                 result = dict(row)
-                result['financial_projections'] = json.loads(result['financial_projections'])
-                result['synergy_breakdown'] = json.loads(result['synergy_breakdown'])
-                result['risk_factors'] = json.loads(result['risk_factors'])
+                result['financial_projections'] = loads_json(result['financial_projections'])
+                result['synergy_breakdown'] = loads_json(result['synergy_breakdown'])
+                result['risk_factors'] = loads_json(result['risk_factors'])
                 results.append(result)
             return results
 
@@ -4,15 +4,80 @@ Handles PDF, Word, and PowerPoint document parsing and content extraction
 """
 
 import os
+import re
 import tempfile
-from typing import Dict, List, Optional, Any
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+import fitz
 import PyPDF2
 from docx import Document
 from pptx import Presentation
-import streamlit as st
 from PIL import Image
 import io
 import base64
+from utils.keyword_matcher import KeywordMatcher
+from utils import notices
+
+# Matches a single whitespace-delimited word
+WORD_PATTERN = re.compile(r'\S+')
+
+# Pages per PyMuPDF extraction job; PDFs that fit in one job are extracted in-process
+PAGES_PER_JOB = 16
+
+def count_words(text: str) -> int:
+    """Count words without materializing a list of tokens"""
+    return sum(1 for _ in WORD_PATTERN.finditer(text))
+
+def join_pages(page_texts: List[Tuple[int, str]]) -> Tuple[str, List[Dict[str, int]]]:
+    """Join page texts with blank lines, indexing where each page sits in the joined text"""
+    pages = []
+    offset = 0
+    for page_number, content in page_texts:
+        pages.append({'page_number': page_number, 'offset': offset, 'length': len(content)})
+        offset += len(content) + 2
+    return '\n\n'.join(content for _, content in page_texts), pages
+
+def extract_page_range(job: Tuple[str, int, int]) -> Tuple[List[Tuple[int, str]], int, List[str]]:
+    """Extract non-empty page texts, their word count and any page errors for pages [start, stop)"""
+    file_path, start, stop = job
+    page_texts = []
+    word_count = 0
+    errors = []
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, stop):
+            try:
+                page_text = doc[page_num].get_text("text")
+                if page_text.strip():
+                    page_texts.append((page_num + 1, page_text.strip()))
+                    word_count += count_words(page_text)
+            except Exception as e:
+                errors.append(f"Could not extract text from page {page_num + 1}: {str(e)}")
+    return page_texts, word_count, errors
+
+# Rule-based feature keywords, in the order they are reported
+FEATURE_KEYWORDS = {
+    'revenue_mentions': ['revenue', 'sales', 'income', 'earnings', 'turnover'],
+    'industry_keywords': [
+        'technology', 'fintech', 'healthcare', 'manufacturing', 'retail',
+        'e-commerce', 'software', 'saas', 'artificial intelligence', 'ai',
+        'machine learning', 'blockchain', 'cryptocurrency', 'biotech'
+    ],
+    'geographic_mentions': [
+        'united states', 'usa', 'europe', 'asia', 'global', 'international',
+        'north america', 'california', 'new york', 'london', 'singapore'
+    ],
+    'employee_mentions': ['employees', 'staff', 'team', 'workforce', 'personnel'],
+    'technology_mentions': [
+        'platform', 'api', 'cloud', 'mobile', 'web', 'database',
+        'analytics', 'automation', 'digital', 'innovation'
+    ]
+}
+
+# Single matcher over every rule-based feature keyword
+FEATURE_KEYWORD_MATCHER = KeywordMatcher(
+    keyword for keywords in FEATURE_KEYWORDS.values() for keyword in keywords
+)
 
 class DocumentProcessor:
     """Handles document parsing and content extraction"""
@@ -25,6 +90,17 @@ class DocumentProcessor:
             'pptx': self._process_pptx,
             'ppt': self._process_pptx   # Will attempt to process as pptx
         }
+        self._page_pool = None
+    
+    def _get_page_pool(self) -> ProcessPoolExecutor:
+        """Get the worker processes for PDF page extraction, starting them on first use"""
+        if self._page_pool is None:
+            # Spawned rather than forked, since the Streamlit server process is multi-threaded
+            self._page_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._page_pool
     
     def process_document(self, file_path: str, file_type: str) -> Dict[str, Any]:
         """
@@ -62,13 +138,66 @@ class DocumentProcessor:
                 'error_message': str(e),
                 'text_content': '',
                 'page_count': 0,
+                'word_count': 0,
                 'metadata': {}
             }
     
     def _process_pdf(self, file_path: str) -> Dict[str, Any]:
-        """Process PDF document"""
-        text_content = []
+        """Process PDF document with PyMuPDF, falling back to PyPDF2 for files it rejects"""
+        try:
+            doc = fitz.open(file_path)
+        except (fitz.FileDataError, RuntimeError):
+            return self._process_pdf_pypdf2(file_path)
+        
+        with doc:
+            # Extract metadata
+            pdf_metadata = doc.metadata or {}
+            metadata = {
+                'title': pdf_metadata.get('title', ''),
+                'author': pdf_metadata.get('author', ''),
+                'subject': pdf_metadata.get('subject', ''),
+                'creator': pdf_metadata.get('creator', ''),
+                'producer': pdf_metadata.get('producer', ''),
+                'creation_date': pdf_metadata.get('creationDate', ''),
+                'modification_date': pdf_metadata.get('modDate', '')
+            }
+            
+            page_count = doc.page_count
+        
+        # Fan page ranges out to worker processes; each reopens the document itself
+        jobs = [
+            (file_path, start, min(start + PAGES_PER_JOB, page_count))
+            for start in range(0, page_count, PAGES_PER_JOB)
+        ]
+        if len(jobs) > 1:
+            results = list(self._get_page_pool().map(extract_page_range, jobs))
+        else:
+            results = [extract_page_range(job) for job in jobs]
+        
+        page_texts = []
+        word_count = 0
+        for job_pages, job_words, job_errors in results:
+            page_texts.extend(job_pages)
+            word_count += job_words
+            for error in job_errors:
+                notices.warning(error)
+        
+        # Pages are stored as offsets into text_content rather than a second copy of their text
+        text_content, pages = join_pages(page_texts)
+        return {
+            'text_content': text_content,
+            'pages': pages,
+            'page_count': page_count,
+            'word_count': word_count,
+            'metadata': metadata,
+            'document_type': 'pdf'
+        }
+    
+    def _process_pdf_pypdf2(self, file_path: str) -> Dict[str, Any]:
+        """Process PDF document with the pure-Python PyPDF2 parser"""
+        page_texts = []
         metadata = {}
+        word_count = 0
         
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -91,17 +220,18 @@ class DocumentProcessor:
                 try:
                     page_text = page.extract_text()
                     if page_text.strip():
-                        text_content.append({
-                            'page_number': page_num + 1,
-                            'content': page_text.strip()
-                        })
+                        page_texts.append((page_num + 1, page_text.strip()))
+                        word_count += count_words(page_text)
                 except Exception as e:
-                    st.warning(f"Could not extract text from page {page_num + 1}: {str(e)}")
+                    notices.warning(f"Could not extract text from page {page_num + 1}: {str(e)}")
         
+        # Pages are stored as offsets into text_content rather than a second copy of their text
+        text_content, pages = join_pages(page_texts)
         return {
-            'text_content': '\n\n'.join([page['content'] for page in text_content]),
-            'pages': text_content,
+            'text_content': text_content,
+            'pages': pages,
             'page_count': page_count,
+            'word_count': word_count,
             'metadata': metadata,
             'document_type': 'pdf'
         }
@@ -111,11 +241,8 @@ class DocumentProcessor:
         try:
             doc = Document(file_path)
             
-            # Extract text content
-            text_content = []
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text_content.append(paragraph.text.strip())
+            # Extract text content, building each paragraph's text once
+            text_content = [text for text in (paragraph.text.strip() for paragraph in doc.paragraphs) if text]
             
             # Extract metadata
             metadata = {
@@ -144,6 +271,7 @@ class DocumentProcessor:
                 'paragraphs': text_content,
                 'tables': tables_content,
                 'page_count': 1,  # Word docs don't have clear page breaks in python-docx
+                'word_count': sum(count_words(paragraph) for paragraph in text_content),
                 'metadata': metadata,
                 'document_type': 'docx'
             }
@@ -165,8 +293,11 @@ class DocumentProcessor:
                 
                 # Extract text from shapes
                 for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        slide_text.append(shape.text.strip())
+                    if not shape.has_text_frame:
+                        continue
+                    text = shape.text_frame.text.strip()
+                    if text:
+                        slide_text.append(text)
                 
                 slide_content = {
                     'slide_number': slide_num + 1,
@@ -193,6 +324,7 @@ class DocumentProcessor:
                 'text_content': '\n\n'.join(all_text),
                 'slides': slides_content,
                 'page_count': len(prs.slides),
+                'word_count': sum(count_words(text) for text in all_text),
                 'metadata': metadata,
                 'document_type': 'pptx'
             }
@@ -214,48 +346,11 @@ class DocumentProcessor:
             'financial_metrics': []
         }
         
-        # Simple keyword-based extraction
-        text_lower = text_content.lower()
+        # Simple keyword-based extraction, scanning the text once for every keyword
+        hits = FEATURE_KEYWORD_MATCHER.find_case_insensitive(text_content)
         
-        # Revenue patterns
-        revenue_keywords = ['revenue', 'sales', 'income', 'earnings', 'turnover']
-        for keyword in revenue_keywords:
-            if keyword in text_lower:
-                features['revenue_mentions'].append(keyword)
-        
-        # Industry keywords
-        industry_keywords = [
-            'technology', 'fintech', 'healthcare', 'manufacturing', 'retail',
-            'e-commerce', 'software', 'saas', 'artificial intelligence', 'ai',
-            'machine learning', 'blockchain', 'cryptocurrency', 'biotech'
-        ]
-        for keyword in industry_keywords:
-            if keyword in text_lower:
-                features['industry_keywords'].append(keyword)
-        
-        # Geographic mentions
-        geo_keywords = [
-            'united states', 'usa', 'europe', 'asia', 'global', 'international',
-            'north america', 'california', 'new york', 'london', 'singapore'
-        ]
-        for keyword in geo_keywords:
-            if keyword in text_lower:
-                features['geographic_mentions'].append(keyword)
-        
-        # Employee mentions
-        employee_keywords = ['employees', 'staff', 'team', 'workforce', 'personnel']
-        for keyword in employee_keywords:
-            if keyword in text_lower:
-                features['employee_mentions'].append(keyword)
-        
-        # Technology mentions
-        tech_keywords = [
-            'platform', 'api', 'cloud', 'mobile', 'web', 'database',
-            'analytics', 'automation', 'digital', 'innovation'
-        ]
-        for keyword in tech_keywords:
-            if keyword in text_lower:
-                features['technology_mentions'].append(keyword)
+        for feature, keywords in FEATURE_KEYWORDS.items():
+            features[feature] = [keyword for keyword in keywords if keyword in hits]
         
         return features
     
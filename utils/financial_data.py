@@ -3,27 +3,57 @@ Financial data integration utilities for Merger Book MVP
 Integrates with Polygon.io and Yahoo Finance APIs to fetch public company data
 """
 
+import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import yfinance as yf
 import pandas as pd
 import time
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from typing import Dict, List, Optional, Any, Tuple
 import streamlit as st
 from utils.config import Config
-from utils.database import DatabaseManager
+from utils.database import DatabaseManager, loads_json
+from utils import notices
+from utils.notices import collect_notices, render_notices
+
+# Local copy of the S&P 500 listing, refreshed from Wikipedia once it is older than the TTL
+SP500_CACHE_PATH = os.path.join('data', 'cache', 'sp500_companies.json')
+SP500_CACHE_TTL = 7 * 24 * 60 * 60  # 1 week
+
+# Minimum spacing between Yahoo Finance requests across all worker threads, to avoid 429s
+YFINANCE_REQUEST_INTERVAL = 0.25
 
 class FinancialDataManager:
     """Manages financial data integration from external APIs"""
     
-    def __init__(self):
+    def __init__(self, db: Optional[DatabaseManager] = None):
         self.polygon_api_key = Config.POLYGON_API_KEY
         self.polygon_base_url = "https://api.polygon.io"
-        self.db = DatabaseManager(Config.DATABASE_PATH)
+        self.db = db or DatabaseManager(Config.DATABASE_PATH)
+        # Keep-alive session for Polygon, retrying transient failures with backoff
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+        ))
         self.rate_limit_delay = 12  # 12 seconds between requests for free tier
+        self.fetch_workers = 5  # Concurrent Yahoo Finance requests when populating
+        self._yfinance_lock = threading.Lock()
+        self._next_yfinance_request = 0.0
     
     def fetch_sp500_companies(self) -> List[Dict[str, Any]]:
         """Fetch S&P 500 companies as potential merger candidates"""
         try:
+            # The constituent list changes a few times a year, so reuse the local copy while fresh
+            if os.path.exists(SP500_CACHE_PATH) and time.time() - os.path.getmtime(SP500_CACHE_PATH) < SP500_CACHE_TTL:
+                with open(SP500_CACHE_PATH, 'rb') as f:
+                    return orjson.loads(f.read())
+            
             # Get S&P 500 list from Wikipedia (free source)
             url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
             tables = pd.read_html(url)
@@ -39,6 +69,10 @@ class FinancialDataManager:
                 }
                 companies.append(company_data)
             
+            os.makedirs(os.path.dirname(SP500_CACHE_PATH), exist_ok=True)
+            with open(SP500_CACHE_PATH, 'wb') as f:
+                f.write(orjson.dumps(companies))
+            
             return companies
             
         except Exception as e:
@@ -49,7 +83,7 @@ class FinancialDataManager:
         """Get company fundamentals from Polygon.io"""
         try:
             if not self.polygon_api_key:
-                st.warning("Polygon API key not configured")
+                notices.warning("Polygon API key not configured")
                 return None
             
             # Get company details
@@ -58,28 +92,30 @@ class FinancialDataManager:
                 'apikey': self.polygon_api_key
             }
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
                 if 'results' in data:
                     return data['results']
             elif response.status_code == 429:
-                st.warning(f"Rate limit hit for {symbol}, skipping...")
-                time.sleep(self.rate_limit_delay)
+                notices.warning(f"Rate limit hit for {symbol}, skipping...")
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(int(retry_after) if retry_after.isdigit() else self.rate_limit_delay)
             else:
-                st.warning(f"Error fetching data for {symbol}: {response.status_code}")
+                notices.warning(f"Error fetching data for {symbol}: {response.status_code}")
             
             return None
             
         except Exception as e:
-            st.warning(f"Error getting fundamentals for {symbol}: {str(e)}")
+            notices.warning(f"Error getting fundamentals for {symbol}: {str(e)}")
             return None
     
-    def get_company_financials_yfinance(self, symbol: str) -> Optional[Dict[str, Any]]:
+    def get_company_financials_yfinance(self, symbol: str, ticker: Optional[yf.Ticker] = None) -> Optional[Dict[str, Any]]:
         """Get company financial data using Yahoo Finance (free alternative)"""
         try:
-            ticker = yf.Ticker(symbol)
+            ticker = ticker or yf.Ticker(symbol)
+            self._wait_for_yfinance_slot()
             info = ticker.info
             
             if not info or 'symbol' not in info:
@@ -109,80 +145,159 @@ class FinancialDataManager:
             return financial_data
             
         except Exception as e:
-            st.warning(f"Error getting Yahoo Finance data for {symbol}: {str(e)}")
+            notices.warning(f"Error getting Yahoo Finance data for {symbol}: {str(e)}")
             return None
     
-    def populate_market_companies(self, max_companies: int = 50) -> int:
-        """Populate database with market companies"""
+    def _wait_for_yfinance_slot(self):
+        """Block until this thread may send its next Yahoo Finance request"""
+        with self._yfinance_lock:
+            now = time.monotonic()
+            wait = self._next_yfinance_request - now
+            self._next_yfinance_request = max(now, self._next_yfinance_request) + YFINANCE_REQUEST_INTERVAL
+        if wait > 0:
+            time.sleep(wait)
+    
+    def fetch_financials_collecting_notices(self, symbol: str, ticker: Optional[yf.Ticker] = None
+                                            ) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, str]]]:
+        """Fetch one ticker's financials on a worker thread, returning them with any notices raised"""
+        with collect_notices() as fetch_notices:
+            financial_data = self.get_company_financials_yfinance(symbol, ticker)
+        return financial_data, fetch_notices
+    
+    def populate_market_companies(self, max_companies: int = 50,
+                                  companies: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Populate database with market companies
+        
+        Args:
+            max_companies: Maximum number of listed companies to consider
+            companies: Company listings (symbol, company_name, sector); fetched from S&P 500 when omitted
+        
+        Returns:
+            Number of companies added
+        """
         try:
-            st.info("Fetching S&P 500 company list...")
-            sp500_companies = self.fetch_sp500_companies()
+            if companies is None:
+                st.info("Fetching S&P 500 company list...")
+                companies = self.fetch_sp500_companies()
             
-            if not sp500_companies:
+            if not companies:
                 st.error("Failed to fetch S&P 500 companies")
                 return 0
             
-            companies_added = 0
+            # Skip tickers already in the database before making any requests
+            existing_tickers = self.db.get_market_tickers()
+            pending = [c for c in companies[:max_companies] if c['symbol'] not in existing_tickers]
+            
+            if not pending:
+                st.info("All selected companies are already in the database.")
+                return 0
+            
             progress_bar = st.progress(0)
             status_text = st.empty()
+            status_text.text(f"Fetching data for {len(pending)} companies...")
             
-            for i, company in enumerate(sp500_companies[:max_companies]):
-                symbol = company['symbol']
-                
-                # Check if company already exists
-                existing_companies = self.db.get_companies_by_user(1)  # Use dummy user_id for market data
-                if any(c.get('ticker_symbol') == symbol for c in existing_companies):
-                    continue
-                
-                status_text.text(f"Processing {symbol} ({i+1}/{min(len(sp500_companies), max_companies)})...")
-                progress_bar.progress((i + 1) / min(len(sp500_companies), max_companies))
-                
-                # Get financial data
-                financial_data = self.get_company_financials_yfinance(symbol)
+            # One Tickers batch shares yfinance's session and crumb across every symbol
+            tickers = yf.Tickers(' '.join(company['symbol'] for company in pending)).tickers
+            
+            # Fetch financial data concurrently, with a small pool to stay within rate limits
+            company_records = []
+            progress_step = max(1, len(pending) // 50)  # At most ~50 progress bar updates
+            with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+                futures = {
+                    executor.submit(
+                        self.fetch_financials_collecting_notices,
+                        company['symbol'], tickers.get(company['symbol'].upper())
+                    ): company
+                    for company in pending
+                }
                 
-                if financial_data:
-                    # Create company record
-                    company_record = {
-                        'company_name': financial_data.get('company_name', company['company_name']),
-                        'ticker_symbol': symbol,
-                        'industry_classification': financial_data.get('industry', company.get('sector', '')),
-                        'revenue': financial_data.get('revenue', 0),
-                        'employee_count': financial_data.get('employees', 0),
-                        'geographic_markets': financial_data.get('country', ''),
-                        'business_description': financial_data.get('business_summary', ''),
-                        'financial_metrics': {
-                            'market_cap': financial_data.get('market_cap', 0),
-                            'pe_ratio': financial_data.get('pe_ratio', 0),
-                            'price_to_book': financial_data.get('price_to_book', 0),
-                            'debt_to_equity': financial_data.get('debt_to_equity', 0),
-                            'return_on_equity': financial_data.get('return_on_equity', 0),
-                            'profit_margins': financial_data.get('profit_margins', 0),
-                            'revenue_growth': financial_data.get('revenue_growth', 0)
-                        },
-                        'strategic_objectives': [],
-                        'data_source': 'market_data',
-                        'user_id': None  # Market data doesn't belong to specific user
-                    }
+                # Workers have no script context, so their warnings are rendered from this thread
+                for i, future in enumerate(as_completed(futures)):
+                    company = futures[future]
+                    financial_data, fetch_notices = future.result()
+                    render_notices(fetch_notices)
+                    if (i + 1) % progress_step == 0:
+                        progress_bar.progress((i + 1) / len(pending))
                     
-                    try:
-                        company_id = self.db.create_company(company_record)
-                        companies_added += 1
-                        st.success(f"Added {financial_data.get('company_name', symbol)} (ID: {company_id})")
-                    except Exception as e:
-                        st.warning(f"Error saving {symbol}: {str(e)}")
-                
-                # Rate limiting
-                time.sleep(1)  # 1 second delay between requests
+                    if financial_data:
+                        company_records.append(self._market_company_record(company, financial_data))
+            
+            # Save all fetched companies in one transaction
+            status_text.text(f"Saving {len(company_records)} companies...")
+            try:
+                self.db.create_companies(company_records)
+            except Exception as e:
+                st.warning(f"Error saving market companies: {str(e)}")
+                return 0
+            
+            skipped = len(pending) - len(company_records)
+            st.success(
+                f"Added {len(company_records)} companies"
+                + (f" ({skipped} skipped with no Yahoo Finance data)" if skipped else "")
+            )
             
             status_text.text("✅ Market data population complete!")
             progress_bar.progress(1.0)
             
-            return companies_added
+            return len(company_records)
             
         except Exception as e:
             st.error(f"Error populating market companies: {str(e)}")
             return 0
     
+    def _market_company_record(self, company: Dict[str, Any], financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a market data company record from a listing and its fetched financials"""
+        return {
+            'company_name': financial_data.get('company_name', company['company_name']),
+            'ticker_symbol': company['symbol'],
+            'industry_classification': financial_data.get('industry', company.get('sector', '')),
+            'revenue': financial_data.get('revenue', 0),
+            'employee_count': financial_data.get('employees', 0),
+            'geographic_markets': financial_data.get('country', ''),
+            'business_description': financial_data.get('business_summary', ''),
+            'financial_metrics': {
+                'market_cap': financial_data.get('market_cap', 0),
+                'pe_ratio': financial_data.get('pe_ratio', 0),
+                'price_to_book': financial_data.get('price_to_book', 0),
+                'debt_to_equity': financial_data.get('debt_to_equity', 0),
+                'return_on_equity': financial_data.get('return_on_equity', 0),
+                'profit_margins': financial_data.get('profit_margins', 0),
+                'revenue_growth': financial_data.get('revenue_growth', 0)
+            },
+            'strategic_objectives': [],
+            'data_source': 'market_data',
+            'user_id': None  # Market data doesn't belong to specific user
+        }
+    
+    def updated_company_record(self, company: Dict[str, Any], financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a stored company record with its size, description and metrics refreshed from fetched financials"""
+        # Rows read straight from the companies table still hold encoded JSON columns
+        financial_metrics = company.get('financial_metrics') or {}
+        if isinstance(financial_metrics, str):
+            financial_metrics = loads_json(financial_metrics)
+        strategic_objectives = company.get('strategic_objectives') or {}
+        if isinstance(strategic_objectives, str):
+            strategic_objectives = loads_json(strategic_objectives)
+        
+        return {
+            **company,
+            'strategic_objectives': strategic_objectives,
+            'revenue': financial_data.get('revenue', company.get('revenue')),
+            'employee_count': financial_data.get('employees', company.get('employee_count')),
+            'business_description': financial_data.get('business_summary', company.get('business_description')),
+            'financial_metrics': {
+                **financial_metrics,
+                'market_cap': financial_data.get('market_cap', 0),
+                'pe_ratio': financial_data.get('pe_ratio', 0),
+                'price_to_book': financial_data.get('price_to_book', 0),
+                'debt_to_equity': financial_data.get('debt_to_equity', 0),
+                'return_on_equity': financial_data.get('return_on_equity', 0),
+                'profit_margins': financial_data.get('profit_margins', 0),
+                'revenue_growth': financial_data.get('revenue_growth', 0)
+            }
+        }
+    
     def update_company_financials(self, company_id: int, symbol: str) -> bool:
         """Update financial data for a specific company"""
         try:
@@ -196,35 +311,10 @@ class FinancialDataManager:
             if not company:
                 return False
             
-            # Update financial metrics
-            updated_metrics = company.get('financial_metrics', {})
-            updated_metrics.update({
-                'market_cap': financial_data.get('market_cap', 0),
-                'pe_ratio': financial_data.get('pe_ratio', 0),
-                'price_to_book': financial_data.get('price_to_book', 0),
-                'debt_to_equity': financial_data.get('debt_to_equity', 0),
-                'return_on_equity': financial_data.get('return_on_equity', 0),
-                'profit_margins': financial_data.get('profit_margins', 0),
-                'revenue_growth': financial_data.get('revenue_growth', 0)
-            })
+            company = self.updated_company_record(company, financial_data)
             
             # Update database
-            with self.db.get_connection() as conn:
-                conn.execute("""
-                    UPDATE companies SET 
-                        revenue = ?,
-                        employee_count = ?,
-                        business_description = ?,
-                        financial_metrics = ?,
-                        last_updated = CURRENT_TIMESTAMP
-                    WHERE company_id = ?
-                """, (
-                    financial_data.get('revenue', company.get('revenue')),
-                    financial_data.get('employees', company.get('employee_count')),
-                    financial_data.get('business_summary', company.get('business_description')),
-                    json.dumps(updated_metrics),
-                    company_id
-                ))
+            self.db.update_company_financials(company_id, company)
             
             return True
             
@@ -249,9 +339,9 @@ class FinancialDataManager:
                     company = dict(row)
                     # Parse JSON fields
                     if company['financial_metrics']:
-                        company['financial_metrics'] = json.loads(company['financial_metrics'])
+                        company['financial_metrics'] = loads_json(company['financial_metrics'])
                     if company['strategic_objectives']:
-                        company['strategic_objectives'] = json.loads(company['strategic_objectives'])
+                        company['strategic_objectives'] = loads_json(company['strategic_objectives'])
                     companies.append(company)
                 
                 return companies
@@ -261,41 +351,32 @@ class FinancialDataManager:
             return []
     
     def get_market_statistics(self) -> Dict[str, Any]:
-        """Get market statistics from the database"""
+        """Get market statistics from the precomputed market_stats_cache table"""
         try:
             with self.db.get_connection() as conn:
                 # Count companies by industry
                 cursor = conn.execute("""
-                    SELECT industry_classification, COUNT(*) as count
-                    FROM companies 
-                    WHERE data_source = 'market_data'
-                    GROUP BY industry_classification
+                    SELECT industry_classification, company_count as count
+                    FROM market_stats_cache
                     ORDER BY count DESC
                 """)
                 industry_counts = dict(cursor.fetchall())
                 
-                # Get revenue statistics
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(*) as total_companies,
-                        AVG(revenue) as avg_revenue,
-                        MAX(revenue) as max_revenue,
-                        MIN(revenue) as min_revenue
-                    FROM companies 
-                    WHERE data_source = 'market_data' AND revenue > 0
-                """)
-                revenue_stats = dict(cursor.fetchone())
-                
-                # Get employee statistics
+                # Get revenue and employee statistics in a single pass
                 cursor = conn.execute("""
                     SELECT 
-                        AVG(employee_count) as avg_employees,
-                        MAX(employee_count) as max_employees,
-                        MIN(employee_count) as min_employees
-                    FROM companies 
-                    WHERE data_source = 'market_data' AND employee_count > 0
+                        COALESCE(SUM(revenue_companies), 0) as total_companies,
+                        SUM(revenue_total) / SUM(revenue_companies) as avg_revenue,
+                        MAX(max_revenue) as max_revenue,
+                        MIN(min_revenue) as min_revenue,
+                        SUM(employee_total) / SUM(employee_companies) as avg_employees,
+                        MAX(max_employees) as max_employees,
+                        MIN(min_employees) as min_employees
+                    FROM market_stats_cache
                 """)
-                employee_stats = dict(cursor.fetchone())
+                stats = dict(cursor.fetchone())
+                revenue_stats = {key: stats[key] for key in ('total_companies', 'avg_revenue', 'max_revenue', 'min_revenue')}
+                employee_stats = {key: stats[key] for key in ('avg_employees', 'max_employees', 'min_employees')}
                 
                 return {
                     'industry_distribution': industry_counts,
@@ -307,6 +388,3 @@ class FinancialDataManager:
             st.error(f"Error getting market statistics: {str(e)}")
             return {}
 
-# Import json for JSON operations
-import json
-
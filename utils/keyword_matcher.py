@@ -0,0 +1,65 @@
+"""
+Keyword matching utilities for Merger Book MVP
+Finds every keyword occurring in a text with a single regex sweep
+"""
+
+import re
+from typing import Iterable, Set
+
+class KeywordMatcher:
+    """Substring matcher for a fixed keyword set"""
+    
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keywords), key=len, reverse=True)
+        
+        # Longest keyword first so each position reports its longest match
+        alternation = '|'.join(re.escape(keyword) for keyword in self.keywords)
+        self.pattern = re.compile(f'(?=({alternation}))')
+        
+        # Shorter keywords sharing a start position are prefixes of the longest one
+        self.prefixes = {
+            keyword: {other for other in self.keywords if keyword.startswith(other)}
+            for keyword in self.keywords
+        }
+    
+    def find(self, text: str) -> Set[str]:
+        """
+        Find all keywords that occur in text
+        
+        Args:
+            text: Text to scan, already normalised to the keywords' case
+        
+        Returns:
+            Set of keywords found anywhere in the text
+        """
+        hits = set()
+        for match in self.pattern.finditer(text):
+            hits |= self.prefixes[match.group(1)]
+        return hits
+    
+    def find_case_insensitive(self, text: str, chunk_size: int = 1 << 20) -> Set[str]:
+        """
+        Find all lowercase keywords that occur in text regardless of case
+        
+        Lowercases the text a chunk at a time instead of copying it whole. Chunks overlap
+        by one character less than the longest keyword, so no occurrence is split.
+        
+        Args:
+            text: Text to scan, in any case
+            chunk_size: Characters lowercased per step
+        
+        Returns:
+            Set of keywords found anywhere in the text
+        """
+        if len(text) <= chunk_size:
+            return self.find(text.lower())
+        
+        overlap = max(len(self.keywords[0]) - 1, 0) if self.keywords else 0
+        hits = set()
+        for start in range(0, len(text), chunk_size):
+            hits |= self.find(text[start:start + chunk_size + overlap].lower())
+        return hits
+    
+    def contains_any(self, text: str) -> bool:
+        """Return True if at least one keyword occurs in text, stopping at the first hit"""
+        return self.pattern.search(text) is not None
@@ -3,14 +3,57 @@ Matching engine for identifying potential merger candidates
 Uses machine learning and similarity analysis to find compatible companies
 """
 
+import re
 import numpy as np
 from typing import Dict, List, Tuple, Any
+from sklearn.base import clone
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
 import pandas as pd
 import streamlit as st
 from utils.config import Config
+from utils.database import loads_json
+
+# Currency symbols and thousands separators stripped from revenue amounts
+REVENUE_NOISE_RE = re.compile(r'[$,]')
+
+# Multipliers for abbreviated revenue amounts such as '1.5M' or '2B'
+REVENUE_SUFFIX_MULTIPLIERS = {'M': 1e6, 'B': 1e9}
+
+# Industry families; industries in the same family count as related
+RELATED_INDUSTRIES = {
+    'technology': ['software', 'fintech', 'artificial intelligence', 'saas'],
+    'financial services': ['fintech', 'banking', 'insurance'],
+    'healthcare': ['biotech', 'pharmaceutical', 'medical'],
+    'retail': ['e-commerce', 'consumer goods', 'marketplace']
+}
+
+# Families each industry belongs to, precomputed so relatedness is one set intersection
+INDUSTRY_FAMILIES = {
+    industry: frozenset(
+        family for family, related in RELATED_INDUSTRIES.items()
+        if industry == family or industry in related
+    )
+    for family, related in RELATED_INDUSTRIES.items()
+    for industry in [family] + related
+}
+
+# Similarity components, in the column order of the per-query factor matrix
+SIMILARITY_FACTORS = (
+    'industry_similarity',
+    'business_similarity',
+    'geographic_similarity',
+    'size_similarity',
+    'strategic_similarity'
+)
+
+# Component weights per match type, in SIMILARITY_FACTORS order
+MATCH_WEIGHTS = {
+    # Horizontal mergers: same industry, focus on geographic and strategic fit
+    'horizontal': np.array([0.3, 0.2, 0.2, 0.1, 0.2]),
+    # Vertical mergers: different industries, focus on business and strategic complementarity
+    'vertical': np.array([0.1, 0.3, 0.2, 0.1, 0.3])
+}
 
 class MatchingEngine:
     """Engine for finding and scoring potential merger candidates"""
@@ -19,7 +62,8 @@ class MatchingEngine:
         self.tfidf_vectorizer = TfidfVectorizer(
             max_features=1000,
             stop_words='english',
-            ngram_range=(1, 2)
+            ngram_range=(1, 2),
+            dtype=np.float32  # Halves the memory traffic of the candidate similarity product
         )
         self.scaler = StandardScaler()
         self.min_match_score = Config.MIN_MATCH_SCORE
@@ -37,31 +81,68 @@ class MatchingEngine:
             List of matches sorted by match score
         """
         try:
-            if not candidate_companies:
+            # Skip the user's own company
+            candidates = [
+                candidate for candidate in candidate_companies
+                if user_company.get('company_id') != candidate.get('company_id')
+                and user_company.get('company_name') != candidate.get('company_name')
+            ]
+            if not candidates:
                 return []
             
-            # Calculate similarity scores
-            matches = []
-            for candidate in candidate_companies:
-                # Skip if same company
-                if (user_company.get('company_id') == candidate.get('company_id') or
-                    user_company.get('company_name') == candidate.get('company_name')):
+            # Extract features once per company rather than once per similarity component
+            user_features = self._extract_matching_features(user_company)
+            
+            # A malformed candidate is skipped on its own instead of failing the whole batch
+            scored_candidates, candidate_features, business_texts, strategic_texts = [], [], [], []
+            for candidate in candidates:
+                try:
+                    features = self._extract_matching_features(candidate)
+                    business_text = self._business_text(features)
+                    strategic_text = self._strategic_text(features)
+                except Exception as e:
+                    st.warning(f"Skipping candidate {candidate.get('company_name', 'unknown')}: {str(e)}")
                     continue
-                
-                match_score, match_type = self._calculate_match_score(user_company, candidate)
-                
-                if match_score >= self.min_match_score:
-                    match = {
-                        'candidate_company': candidate,
-                        'match_score': match_score,
-                        'match_type': match_type,
-                        'similarity_factors': self._get_similarity_factors(user_company, candidate)
-                    }
-                    matches.append(match)
+                scored_candidates.append(candidate)
+                candidate_features.append(features)
+                business_texts.append(business_text)
+                strategic_texts.append(strategic_text)
+            candidates = scored_candidates
+            if not candidates:
+                return []
+            
+            # Score every component against all candidates at once, one column per factor
+            factor_matrix = np.column_stack([
+                self._batch_industry_similarity(user_features, candidate_features),
+                self._batch_text_similarity(self._business_text(user_features), business_texts),
+                self._batch_geographic_similarity(user_features, candidate_features),
+                self._batch_size_similarity(user_features, candidate_features),
+                self._batch_text_similarity(self._strategic_text(user_features), strategic_texts)
+            ])
             
-            # Sort by match score and limit results
-            matches.sort(key=lambda x: x['match_score'], reverse=True)
-            return matches[:self.max_matches]
+            # Weighted score per candidate; horizontal when industries are the same or closely related
+            horizontal = factor_matrix[:, 0] >= 0.7
+            weights = np.where(horizontal[:, None], MATCH_WEIGHTS['horizontal'], MATCH_WEIGHTS['vertical'])
+            match_scores = np.minimum((factor_matrix * weights).sum(axis=1), 1.0)
+            
+            # Keep the top qualifying matches without sorting the whole list
+            qualifying = np.flatnonzero(match_scores >= self.min_match_score)
+            if len(qualifying) > self.max_matches:
+                # Partition to find the cut-off score, keeping every tie so earlier candidates win them
+                cutoff = -np.partition(-match_scores[qualifying], self.max_matches - 1)[self.max_matches - 1]
+                qualifying = qualifying[match_scores[qualifying] >= cutoff]
+            top = qualifying[np.lexsort((qualifying, -match_scores[qualifying]))][:self.max_matches]
+            
+            # Build result dicts only for the matches returned
+            return [
+                {
+                    'candidate_company': candidates[i],
+                    'match_score': float(match_scores[i]),
+                    'match_type': 'horizontal' if horizontal[i] else 'vertical',
+                    'similarity_factors': dict(zip(SIMILARITY_FACTORS, factor_matrix[i].tolist()))
+                }
+                for i in top
+            ]
             
         except Exception as e:
             st.error(f"Error in matching engine: {str(e)}")
@@ -75,74 +156,44 @@ class MatchingEngine:
             Tuple of (match_score, match_type)
         """
         try:
-            # Extract features for comparison
-            features1 = self._extract_matching_features(company1)
-            features2 = self._extract_matching_features(company2)
-            
-            # Calculate different similarity components
-            industry_sim = self._calculate_industry_similarity(features1, features2)
-            business_sim = self._calculate_business_similarity(features1, features2)
-            geographic_sim = self._calculate_geographic_similarity(features1, features2)
-            size_sim = self._calculate_size_similarity(features1, features2)
-            strategic_sim = self._calculate_strategic_similarity(features1, features2)
-            
-            # Determine match type
-            match_type = self._determine_match_type(features1, features2, industry_sim)
-            
-            # Weight the similarities based on match type
-            if match_type == 'horizontal':
-                # Horizontal mergers: same industry, focus on geographic and strategic fit
-                weights = {
-                    'industry': 0.3,
-                    'business': 0.2,
-                    'geographic': 0.2,
-                    'size': 0.1,
-                    'strategic': 0.2
-                }
-            else:  # vertical
-                # Vertical mergers: different industries, focus on business and strategic complementarity
-                weights = {
-                    'industry': 0.1,
-                    'business': 0.3,
-                    'geographic': 0.2,
-                    'size': 0.1,
-                    'strategic': 0.3
-                }
-            
-            # Calculate weighted score
-            match_score = (
-                industry_sim * weights['industry'] +
-                business_sim * weights['business'] +
-                geographic_sim * weights['geographic'] +
-                size_sim * weights['size'] +
-                strategic_sim * weights['strategic']
-            )
-            
-            return min(match_score, 1.0), match_type
+            return self._score_similarity_factors(self._get_similarity_factors(company1, company2))
             
         except Exception as e:
             st.warning(f"Error calculating match score: {str(e)}")
             return 0.0, 'unknown'
     
+    def _score_similarity_factors(self, similarity_factors: Dict[str, float]) -> Tuple[float, str]:
+        """
+        Combine the five similarity components into a weighted match score
+        
+        Returns:
+            Tuple of (match_score, match_type)
+        """
+        # Determine match type: horizontal when industries are the same or closely related
+        match_type = 'horizontal' if similarity_factors['industry_similarity'] >= 0.7 else 'vertical'
+        
+        # Weighted score, summed the same way as the batch path in find_matches
+        factors = np.array([similarity_factors[factor] for factor in SIMILARITY_FACTORS])
+        match_score = float((factors * MATCH_WEIGHTS[match_type]).sum())
+        
+        return min(match_score, 1.0), match_type
+    
     def _extract_matching_features(self, company: Dict) -> Dict[str, Any]:
         """Extract features relevant for matching"""
         # Handle both database format and business features format
         if 'financial_metrics' in company and isinstance(company['financial_metrics'], str):
-            # Database format - parse JSON strings
-            import json
-            financial_metrics = json.loads(company.get('financial_metrics', '{}'))
-            strategic_objectives = json.loads(company.get('strategic_objectives', '{}'))
+            # Database format - parse JSON strings (financial metrics don't feed matching, so stay encoded)
+            strategic_objectives = loads_json(company.get('strategic_objectives') or '{}')
             business_features = {}
         else:
             # Business features format
-            financial_metrics = company.get('financial_metrics', {})
             strategic_objectives = company.get('strategic_objectives', [])
             business_features = company
         
         return {
             'company_name': company.get('company_name', ''),
-            'industry': company.get('industry_classification', business_features.get('industry_classification', '')),
-            'business_model': business_features.get('business_model', ''),
+            'industry': company.get('industry_classification', business_features.get('industry_classification', '')) or '',
+            'business_model': business_features.get('business_model', '') or '',
             'revenue': company.get('revenue', 0) or self._extract_revenue(business_features.get('revenue_info', {})),
             'employee_count': company.get('employee_count', 0) or business_features.get('employee_count', 0),
             'geographic_markets': company.get('geographic_markets', '').split(',') if company.get('geographic_markets') else business_features.get('geographic_markets', []),
@@ -158,8 +209,11 @@ class MatchingEngine:
         try:
             amount_str = revenue_info.get('amount', '0')
             if isinstance(amount_str, str):
-                # Remove currency symbols and convert to float
-                amount_str = amount_str.replace('$', '').replace(',', '').replace('M', '000000').replace('B', '000000000')
+                # Remove currency symbols, then scale by a trailing M/B suffix
+                amount_str = REVENUE_NOISE_RE.sub('', amount_str).strip()
+                multiplier = REVENUE_SUFFIX_MULTIPLIERS.get(amount_str[-1:])
+                if multiplier:
+                    return float(amount_str[:-1]) * multiplier
                 return float(amount_str)
             return float(amount_str)
         except:
@@ -167,8 +221,8 @@ class MatchingEngine:
     
     def _calculate_industry_similarity(self, features1: Dict, features2: Dict) -> float:
         """Calculate industry similarity"""
-        industry1 = features1.get('industry', '').lower()
-        industry2 = features2.get('industry', '').lower()
+        industry1 = (features1.get('industry') or '').lower()
+        industry2 = (features2.get('industry') or '').lower()
         
         if not industry1 or not industry2:
             return 0.5  # Neutral score if industry unknown
@@ -178,134 +232,175 @@ class MatchingEngine:
             return 1.0
         
         # Related industries
-        related_industries = {
-            'technology': ['software', 'fintech', 'artificial intelligence', 'saas'],
-            'financial services': ['fintech', 'banking', 'insurance'],
-            'healthcare': ['biotech', 'pharmaceutical', 'medical'],
-            'retail': ['e-commerce', 'consumer goods', 'marketplace']
-        }
-        
-        for main_industry, related in related_industries.items():
-            if (industry1 in [main_industry] + related and 
-                industry2 in [main_industry] + related):
-                return 0.7
+        if INDUSTRY_FAMILIES.get(industry1, frozenset()) & INDUSTRY_FAMILIES.get(industry2, frozenset()):
+            return 0.7
         
         return 0.2  # Different industries
     
+    def _batch_industry_similarity(self, user_features: Dict, candidate_features: List[Dict]) -> np.ndarray:
+        """Calculate industry similarity against every candidate, once per distinct industry"""
+        similarity_by_industry = {}
+        similarities = np.empty(len(candidate_features))
+        for i, features in enumerate(candidate_features):
+            industry = features.get('industry') or ''
+            if industry not in similarity_by_industry:
+                similarity_by_industry[industry] = self._calculate_industry_similarity(
+                    user_features, {'industry': industry}
+                )
+            similarities[i] = similarity_by_industry[industry]
+        return similarities
+    
+    @staticmethod
+    def _business_text(features: Dict) -> str:
+        """Combine business-related text"""
+        return ' '.join([
+            features.get('business_model', ''),
+            ' '.join(features.get('products_services', [])),
+            ' '.join(features.get('competitive_advantages', []))
+        ])
+    
+    @staticmethod
+    def _strategic_text(features: Dict) -> str:
+        """Combine strategic text"""
+        return ' '.join([
+            ' '.join(features.get('strategic_objectives', [])),
+            ' '.join(features.get('target_customers', []))
+        ])
+    
+    def _batch_text_similarity(self, query_text: str, texts: List[str]) -> np.ndarray:
+        """
+        Calculate TF-IDF cosine similarity of one text against many with a single fit
+        
+        Args:
+            query_text: Text to compare against
+            texts: Texts to score
+        
+        Returns:
+            Array of similarities aligned with texts; 0.5 where either side has no text
+        """
+        similarities = np.full(len(texts), 0.5)
+        present = [i for i, text in enumerate(texts) if text.strip()]
+        if not query_text.strip() or not present:
+            return similarities
+        
+        try:
+            # Fit a fresh copy since the engine is shared across sessions
+            tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([query_text] + [texts[i] for i in present])
+        except ValueError:
+            return similarities  # Nothing left to vectorize once stop words are removed
+        
+        # TF-IDF rows are L2-normalized, so their dot products are cosine similarities
+        similarities[present] = (tfidf_matrix[1:] @ tfidf_matrix[0].T).toarray().ravel()
+        return similarities
+    
     def _calculate_business_similarity(self, features1: Dict, features2: Dict) -> float:
         """Calculate business model and offering similarity"""
         try:
-            # Combine business-related text
-            text1 = ' '.join([
-                features1.get('business_model', ''),
-                ' '.join(features1.get('products_services', [])),
-                ' '.join(features1.get('competitive_advantages', []))
-            ])
-            
-            text2 = ' '.join([
-                features2.get('business_model', ''),
-                ' '.join(features2.get('products_services', [])),
-                ' '.join(features2.get('competitive_advantages', []))
-            ])
+            text1 = self._business_text(features1)
+            text2 = self._business_text(features2)
             
             if not text1.strip() or not text2.strip():
                 return 0.5
             
-            # Use TF-IDF similarity
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform([text1, text2])
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            
-            return similarity
+            # Use TF-IDF similarity; normalized rows make it a plain sparse dot product
+            tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([text1, text2])
+            return float(tfidf_matrix[0].multiply(tfidf_matrix[1]).sum())
             
         except Exception as e:
             return 0.5
     
     def _calculate_geographic_similarity(self, features1: Dict, features2: Dict) -> float:
         """Calculate geographic market overlap"""
-        markets1 = set([m.lower().strip() for m in features1.get('geographic_markets', [])])
-        markets2 = set([m.lower().strip() for m in features2.get('geographic_markets', [])])
+        return float(self._batch_geographic_similarity(features1, [features2])[0])
+    
+    def _batch_geographic_similarity(self, user_features: Dict, candidate_features: List[Dict]) -> np.ndarray:
+        """
+        Calculate geographic market overlap of one company against many
         
-        if not markets1 or not markets2:
-            return 0.5
+        Markets are encoded as rows of a boolean company-by-market matrix so every
+        candidate's Jaccard similarity comes from one pass of array operations.
         
-        # Calculate Jaccard similarity
-        intersection = len(markets1.intersection(markets2))
-        union = len(markets1.union(markets2))
+        Returns:
+            Array of similarities aligned with candidate_features
+        """
+        market_ids = {}
+        def encode(features: Dict) -> List[int]:
+            return [
+                market_ids.setdefault(market.lower().strip(), len(market_ids))
+                for market in features.get('geographic_markets', [])
+            ]
         
-        if union == 0:
-            return 0.5
+        user_ids = encode(user_features)
+        candidate_ids = [encode(features) for features in candidate_features]
         
-        jaccard_sim = intersection / union
+        # One row per candidate, one column per distinct market
+        membership = np.zeros((len(candidate_features), len(market_ids)), dtype=bool)
+        for row, ids in enumerate(candidate_ids):
+            membership[row, ids] = True
+        user_membership = np.zeros(len(market_ids), dtype=bool)
+        user_membership[user_ids] = True
         
-        # Boost score for complementary markets (good for expansion)
-        if intersection == 0 and len(markets1) > 0 and len(markets2) > 0:
-            return 0.7  # Complementary markets are valuable
+        intersection = (membership & user_membership).sum(axis=1)
+        union = (membership | user_membership).sum(axis=1)
         
-        return jaccard_sim
+        # Neutral when either side lists no markets; complementary markets are valuable for expansion
+        sims = np.divide(intersection, union, out=np.zeros(len(candidate_features)), where=union > 0)
+        sims[intersection == 0] = 0.7
+        if not user_ids:
+            sims[:] = 0.5
+        sims[membership.sum(axis=1) == 0] = 0.5
+        return sims
     
     def _calculate_size_similarity(self, features1: Dict, features2: Dict) -> float:
         """Calculate company size compatibility"""
-        try:
-            revenue1 = features1.get('revenue', 0)
-            revenue2 = features2.get('revenue', 0)
-            employees1 = features1.get('employee_count', 0)
-            employees2 = features2.get('employee_count', 0)
-            
-            # If no size data, return neutral
-            if not any([revenue1, revenue2, employees1, employees2]):
-                return 0.5
-            
-            # Calculate revenue ratio similarity
-            revenue_sim = 0.5
-            if revenue1 > 0 and revenue2 > 0:
-                ratio = min(revenue1, revenue2) / max(revenue1, revenue2)
-                revenue_sim = ratio
-            
-            # Calculate employee ratio similarity
-            employee_sim = 0.5
-            if employees1 > 0 and employees2 > 0:
-                ratio = min(employees1, employees2) / max(employees1, employees2)
-                employee_sim = ratio
-            
-            # Average the similarities
-            return (revenue_sim + employee_sim) / 2
-            
-        except Exception as e:
-            return 0.5
+        return float(self._batch_size_similarity(features1, [features2])[0])
+    
+    @staticmethod
+    def _size_values(features_list: List[Dict], key: str) -> np.ndarray:
+        """Collect a size measure across companies, treating missing or non-numeric values as 0"""
+        return np.array([
+            value if isinstance(value, (int, float)) else 0
+            for value in (features.get(key, 0) for features in features_list)
+        ], dtype=np.float64)
+    
+    def _batch_size_similarity(self, user_features: Dict, candidate_features: List[Dict]) -> np.ndarray:
+        """
+        Calculate size compatibility of one company against many
+        
+        Each of revenue and headcount scores the smaller-to-larger ratio when both sides
+        are positive and 0.5 otherwise; the two scores are averaged.
+        
+        Returns:
+            Array of similarities aligned with candidate_features
+        """
+        sims = np.zeros(len(candidate_features))
+        for key in ('revenue', 'employee_count'):
+            user_value = self._size_values([user_features], key)[0]
+            values = self._size_values(candidate_features, key)
+            both_positive = (values > 0) & (user_value > 0)
+            ratios = np.divide(
+                np.minimum(values, user_value), np.maximum(values, user_value),
+                out=np.full(len(values), 0.5), where=both_positive
+            )
+            sims += ratios
+        return sims / 2
     
     def _calculate_strategic_similarity(self, features1: Dict, features2: Dict) -> float:
         """Calculate strategic alignment"""
         try:
-            # Combine strategic text
-            text1 = ' '.join([
-                ' '.join(features1.get('strategic_objectives', [])),
-                ' '.join(features1.get('target_customers', []))
-            ])
-            
-            text2 = ' '.join([
-                ' '.join(features2.get('strategic_objectives', [])),
-                ' '.join(features2.get('target_customers', []))
-            ])
+            text1 = self._strategic_text(features1)
+            text2 = self._strategic_text(features2)
             
             if not text1.strip() or not text2.strip():
                 return 0.5
             
-            # Use TF-IDF similarity
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform([text1, text2])
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            
-            return similarity
+            # Use TF-IDF similarity; normalized rows make it a plain sparse dot product
+            tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([text1, text2])
+            return float(tfidf_matrix[0].multiply(tfidf_matrix[1]).sum())
             
         except Exception as e:
             return 0.5
     
-    def _determine_match_type(self, features1: Dict, features2: Dict, industry_similarity: float) -> str:
-        """Determine if match is horizontal or vertical"""
-        if industry_similarity >= 0.7:
-            return 'horizontal'
-        else:
-            return 'vertical'
-    
     def _get_similarity_factors(self, company1: Dict, company2: Dict) -> Dict[str, float]:
         """Get detailed similarity breakdown"""
         features1 = self._extract_matching_features(company1)
@@ -360,15 +455,19 @@ class MatchingEngine:
         factors_array = np.array(factors_data)
         scores_array = np.array(scores)
         
-        correlations = []
-        for i in range(factors_array.shape[1]):
-            corr = np.corrcoef(factors_array[:, i], scores_array)[0, 1]
-            correlations.append(abs(corr) if not np.isnan(corr) else 0)
+        # Pearson correlation of every factor column with the scores in one pass
+        factors_centered = factors_array - factors_array.mean(axis=0)
+        scores_centered = scores_array - scores_array.mean()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations = (factors_centered.T @ scores_centered) / np.sqrt(
+                (factors_centered ** 2).sum(axis=0) * (scores_centered ** 2).sum()
+            )
+        correlations = np.abs(np.nan_to_num(correlations, nan=0.0))
         
         # Normalize to sum to 1
-        total_corr = sum(correlations)
+        total_corr = correlations.sum()
         if total_corr > 0:
-            normalized_importance = [c / total_corr for c in correlations]
+            normalized_importance = (correlations / total_corr).tolist()
         else:
             normalized_importance = [0.2] * 5
         
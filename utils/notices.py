@@ -0,0 +1,52 @@
+"""
+User-facing notices for Merger Book MVP
+Shows warnings and errors with Streamlit, or collects them for work running off the script thread
+"""
+
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+import streamlit as st
+
+# Notices raised under collect_notices, as (level, message) pairs; None renders immediately
+_collected_notices: contextvars.ContextVar = contextvars.ContextVar('collected_notices', default=None)
+
+@contextmanager
+def collect_notices() -> Iterator[List[Tuple[str, str]]]:
+    """
+    Collect notices raised in this context instead of rendering them
+    
+    Worker threads have no Streamlit script context, so st.warning/st.error calls there
+    are dropped. Collected notices are rendered later with render_notices. Work handed to
+    another thread must run under contextvars.copy_context() to keep collecting.
+    
+    Yields:
+        List that receives (level, message) pairs
+    """
+    notices = []
+    token = _collected_notices.set(notices)
+    try:
+        yield notices
+    finally:
+        _collected_notices.reset(token)
+
+def warning(message: str):
+    """Show a warning, or collect it when a collector is active"""
+    _notify('warning', message)
+
+def error(message: str):
+    """Show an error, or collect it when a collector is active"""
+    _notify('error', message)
+
+def _notify(level: str, message: str):
+    """Route a notice to the active collector or straight to Streamlit"""
+    notices = _collected_notices.get()
+    if notices is None:
+        getattr(st, level)(message)
+    else:
+        notices.append((level, message))
+
+def render_notices(notices: List[Tuple[str, str]]):
+    """Render collected notices on the script thread"""
+    for level, message in notices:
+        getattr(st, level)(message)